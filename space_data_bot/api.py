@@ -22,63 +22,312 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import base64
+import codecs
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
 import requests
-from space_data_bot import envs, content
+from space_data_bot import envs, content, cache, capture
+from space_data_bot.endpoints import ENDPOINTS, NO_ID, PAGE_NUMBER, \
+    Endpoint, canonical
+from space_data_bot.messages import MessageCache
+from space_data_bot.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# cached in place of the body of an empty or not found result
+NEGATIVE = b""
+
+
+class ResponseTooLarge(requests.RequestException):
+    """A body above the byte ceiling of its endpoint. The rest of the body
+    can still be read from `chunks`, after `head`."""
+
+    def __init__(self, response: requests.Response, head: bytes, chunks,
+                 max_bytes: int) -> None:
+        super().__init__(f"body above {max_bytes} bytes", response=response)
+        self.head = head
+        self.chunks = chunks
+
+
+def _limit_body(resp: requests.Response, max_bytes: int) -> None:
+    """Loads a streamed body, unless it is larger than max_bytes."""
+    length = resp.headers.get("Content-Length", "")
+    chunks = resp.iter_content(envs.STREAM_CHUNK)
+    head = []
+    size = 0
+
+    if not (length.isdigit() and int(length) > max_bytes):
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                break
+        else:
+            resp._content = b"".join(head)
+            return
+
+    raise ResponseTooLarge(resp, b"".join(head), chunks, max_bytes)
+
+
+_RESULTS = re.compile(r'"results"\s*:\s*\[')
+_SEPARATORS = re.compile(r"[\s,]*")
+_RECORD_ENDS = (",", "]", " ", "\t", "\r", "\n")
+
+
+def _stream_records(head: bytes, chunks, limit: int, max_bytes: int):
+    """Decodes the first records of a JSON list, or of the "results" list of
+    a page, reading the rest of the body to count the records and to get
+    the keys of the page that follow them. At most max_bytes are held in
+    memory, whatever the size of the body.
+
+    Returns:
+        tuple: (list | dict: the data, with limit records at most,
+            int: the number of records of the body)
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = utf8.decode(head)
+
+    def more() -> bool:
+        nonlocal buffer
+        if len(buffer) > max_bytes:  # the unread part, not decodable yet
+            raise ValueError("a record is larger than the byte ceiling")
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer += utf8.decode(chunk)
+        return True
+
+    page = None
+    while True:  # the records start after "[", or '"results": [' in a page
+        start = buffer.lstrip()[:1]
+        if start == "[":
+            position = buffer.index("[") + 1
+            break
+        match = _RESULTS.search(buffer)
+        if start == "{" and match:  # other keys may come first
+            page = json.loads(
+                buffer[:match.start()].rstrip().rstrip(",") + "}")
+            position = match.end()
+            break
+        if not more():
+            raise ValueError("no records in the body")
+
+    records = []
+    total = 0
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position == len(buffer):
+            if not more():
+                raise ValueError("truncated body")
+            continue
+        if buffer[position] == "]":
+            break
+
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if not more():
+                raise
+            continue
+        # a number cut by the chunk ends before its last digits
+        if buffer[end:end + 1] not in _RECORD_ENDS and more():
+            continue
+        position = end
+
+        if total < limit:
+            records.append(record)
+        total += 1
+        buffer = buffer[position:]  # only the unread part is kept
+        position = 0
+
+    if page is None:
+        return records, total
+
+    rest, buffer = buffer[position + 1:], ""  # the keys after the records
+    while more():
+        rest, buffer = rest + buffer, ""
+        if len(rest) > max_bytes:
+            raise ValueError("the page keys are larger than the byte ceiling")
+    rest = rest.strip().lstrip(",").strip()
+    if rest != "}":
+        page.update(json.loads("{" + rest))
+    page["results"] = records
+    return page, total
+
+
+def _jwt_expiry(token: str) -> float:
+    """The expiry time of a JWT, read without checking its signature: the
+    token comes from recon.space, it only tells whether to trust it.
+
+    Returns:
+        float: the "exp" claim, None if unknown
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _is_empty(data) -> bool:
+    if isinstance(data, dict) and "results" in data:
+        return not data["results"]
+    return not data
 
 
 class SpaceDataApi:
-    def __init__(self) -> None:
-        self._url = envs.API_ROOT
-        self._tokens = {}
 
-    def _get(self, url: str, headers: dict = None,
-             filters: dict = None) -> requests.Response:
+    def __init__(self, backend: cache.CacheBackend = None) -> None:
+        """
+        Args:
+            backend (cache.CacheBackend, optional): where responses and
+                tokens are kept, shared between bot processes if it is a
+                RedisBackend. Defaults to the backend of envs.CACHE_URL.
+        """
+        self._url = envs.API_ROOT
+        self._backend = backend or cache.from_url(envs.CACHE_URL)
+        self._flights = {}  # key -> [lock, threads using it]
+        self._flights_lock = threading.Lock()
+        self._decoded = OrderedDict()  # body digest -> data
+        self._decoded_lock = threading.Lock()
+        self._refresher = None  # background revalidations
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        self._listeners = []
+        self.messages = MessageCache()  # rendered messages
+        self.capture = capture.from_env()  # None unless envs.CAPTURE_PATH
+
+    def _get(self, url: str, headers: dict = None, filters: dict = None,
+             timeout: float = envs.DEFAULT_TIMEOUT, retries: int = 0,
+             max_bytes: int = None) -> requests.Response:
         """Makes a customized GET request
 
         Args:
             url (str): the request url
             headers (dict, optional): token and additionals. Defaults to None.
             filters (dict, optional): search filters. Defaults to None.
+            timeout (float, optional): seconds before giving up.
+            retries (int, optional): new attempts after a network error.
+            max_bytes (int, optional): raises ResponseTooLarge beyond, the
+                body is then left unread.
 
         Returns:
             requests.Response
         """
         if filters:
-            query = "&".join([f"{k}={v}" for k, v in filters.items()])
+            query = urlencode(sorted(filters.items()), safe=",")
             url += f"/?{query}"
 
-        if headers:
-            return requests.get(url, headers=headers)
-
-        return requests.get(url)
+        for attempt in range(retries + 1):
+            try:
+                resp = requests.get(url, headers=headers, timeout=timeout,
+                                    stream=max_bytes is not None)
+                if max_bytes is not None:
+                    _limit_body(resp, max_bytes)
+                return resp
+            except ResponseTooLarge:
+                raise
+            except requests.RequestException:
+                if attempt == retries:
+                    raise
+                time.sleep(envs.RETRY_BACKOFF * 2 ** attempt)
 
     def _post(self, url: str, data: dict) -> requests.Response:
         url += "/#post-object-form"
 
         return requests.post(url, json=data)
-    
-    def _pack_get(self, token: str, endpoint: str) -> str:
-        """Allows a user to get information about domains owned by a space
-        organization.
+
+    def get_token(self, id: str = 0, type: str = "access") -> str:
+        data = self._backend.get(f"{envs.CACHE_PREFIX}token:{id}")
+        if data:
+            return json.loads(data).get(type, "")
+
+    def set_token(self, id: str, data: dict) -> None:
+        key = f"{envs.CACHE_PREFIX}token:{id}"
+        old = self._backend.get(key)
+        if old:  # a refresh only sends a new access token
+            data = {**json.loads(old), **data}
+
+        self._backend.set(key, json.dumps(data).encode(), envs.TOKEN_TTL)
+        if data.get("access"):  # just issued by recon.space
+            self._seen_valid(data["access"])
+
+    def _token_key(self, token: str) -> str:
+        return f"{envs.CACHE_PREFIX}seen:" \
+            f"{hashlib.sha256(token.encode()).hexdigest()[:16]}"
+
+    def _seen_valid(self, token: str) -> None:
+        """Remembers that recon.space accepted a token, until it expires."""
+        ttl = envs.TOKEN_SEEN_TTL
+        expiry = _jwt_expiry(token)
+        if expiry is not None:
+            ttl = min(ttl, expiry - time.time())
+        if ttl > 0:
+            self._backend.set(self._token_key(token), b"1", ttl)
+
+    def trusted(self, token: str) -> bool:
+        """A token can read the responses shared between users if it did
+        not expire and recon.space accepted it recently."""
+        if not token:
+            return False
+
+        expiry = _jwt_expiry(token)
+        if expiry is not None and expiry <= time.time():
+            return False
+        return self._backend.get(self._token_key(token)) is not None
+
+    def verify(self, token: str) -> bool:
+        """Asks recon.space whether it accepts a token, when it is not
+        trusted yet, see trusted().
 
         Returns:
-            str: Results with MD syntax
+            bool: True if the token is trusted
         """
-        url = f"{self._url}/{endpoint}"
-        headers = {"Authorization": f"JWT {token}"}
+        if self.trusted(token):
+            return True
+        if not token:
+            return False
 
-        resp = self._get(url, headers=headers)
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+        try:
+            resp = self.request(envs.ACCOUNT, token)
+        except requests.RequestException:
+            metrics.incr("upstream_errors", endpoint=envs.ACCOUNT)
+            return False
 
-    def get_token(self, id: str = 0, type: str = "access") -> str:
-        if self._tokens.get(id, None):
-            return self._tokens[id].get(type, "")
+        if resp.status_code != 200:
+            return False
+        self._seen_valid(token)
+        return True
 
-    def set_token(self, id: str, data: dict) -> None:
-        self._tokens[id] = data
+    def get_view(self, id: str) -> tuple:
+        """The render mode chosen by a user, see messages.MODES.
+
+        Returns:
+            tuple: (mode, columns), empty strings if never chosen
+        """
+        data = self._backend.get(f"{envs.CACHE_PREFIX}view:{id}")
+        if data:
+            data = json.loads(data)
+            return data["mode"], data["columns"]
+        return "", ""
+
+    def set_view(self, id: str, mode: str, columns: str = "") -> None:
+        self._backend.set(f"{envs.CACHE_PREFIX}view:{id}", json.dumps(
+            {"mode": mode, "columns": columns}).encode())
 
     def update_token(self, id: str) -> str:
         data = {"refresh": self.get_token(id, type="refresh")}
@@ -90,6 +339,37 @@ class SpaceDataApi:
 
             return new_data["access"]
 
+    def with_token(self, id: str, token: str, call, rejected=None) -> tuple:
+        """Calls recon.space with the access token of a user, refreshing it
+        once if recon.space rejects it.
+
+        Args:
+            id (str): the user of the token
+            token (str): its access token, None if not connected: it is
+                not refreshed then
+            call (Callable): call(token), raising a requests.HTTPError with
+                a 401 status code if the token is rejected
+            rejected (Callable, optional): rejected(result) is True if the
+                result of call means that the token is rejected, eg: the
+                content.LOG_ERROR message of load()
+
+        Returns:
+            tuple: (result of call, token used)
+        """
+        try:
+            result = call(token)
+        except requests.HTTPError as error:
+            if not token or error.response is None \
+                    or error.response.status_code != 401:
+                raise
+        else:
+            if not token or rejected is None or not rejected(result):
+                return result, token
+
+        metrics.incr("token_refreshes")
+        token = self.update_token(id)
+        return call(token), token
+
     def connect(self, email: str, password: str, id: str = 0) -> dict:
         url = f"{self._url}/{envs.TOKEN}"
         data = {
@@ -109,286 +389,537 @@ class SpaceDataApi:
 
         return content.LOG_SUCCESS
 
-    def orgnamepublic(self, orgname: str = "", tags: str = "") -> str:
-        """Allows a user to get information about space organizations
-        (50% of DB content). (GET)
-
-        Args:
-            orgname (str, optional): The name of the organization.
-            tags (str, optional): some tags.
+    def subscribe(self, listener) -> None:
+        """Calls listener(path, results) with the records of every response
+        downloaded from recon.space, in the thread of the request."""
+        self._listeners.append(listener)
+
+    def _publish(self, path: str, data) -> None:
+        if isinstance(data, dict):
+            data = data.get("results")
+        if not isinstance(data, list):
+            return
+
+        for listener in self._listeners:
+            try:
+                listener(path, data)
+            except Exception:
+                logger.exception("listener of %s failed", path)
+
+    def _cache_key(self, path: str, id: str, query: dict,
+                   token: str = None) -> str:
+        key = f"{envs.CACHE_PREFIX}resp:{path}:{id}:{canonical(query)}"
+        if token:  # never store a token in clear
+            key += ":" + hashlib.sha256(token.encode()).hexdigest()[:16]
+        return key
+
+    def _read(self, key: str) -> tuple:
+        """Reads a cached response, even expired, stored as a JSON header
+        line (expiry, digest and validators) followed by the body.
 
         Returns:
-            str: Results with MD syntax
+            tuple: (header, body), (None, None) if not cached
         """
-        url = f"{self._url}/{envs.ORGNAMEPUBLIC}"
-
-        filters = {}
-        if orgname:
-            filters["orgname"] = orgname
-
-        if tags:
-            filters["tags"] = tags
-
-        if not filters:
-            return content.ORGNAME_DEFAULT
-
-        resp = self._get(url, filters=filters)
-        data = resp.json()["results"]
-
-        if not data:  # no result
-            return content.EMPTY
-
-        elif len(data) > envs.MAX_ITER_NUMBER:  # too much results
-            return content.too_much_data(data, "organisationname")
-
-        else:  # sends requested info
-            return content.data_message(data)
-
-    def orgnamegpspublic(self, orgname: str = "", tags: str = "") -> str:
-        """Allows a user to get information about the localization of space
-        organizations (33% of DB content). (GET)
+        raw = self._backend.get(key)
+        if raw is None:
+            return None, None
+
+        header, _, body = raw.partition(b"\n")
+        return json.loads(header), body
+
+    def _write(self, key: str, body: bytes, ttl: float,
+               validators: dict = None) -> None:
+        """Caches a response for ttl seconds. Responses are kept
+        envs.REVALIDATE_TTL seconds longer to be revalidated once expired,
+        except empty results."""
+        header = {"expires": time.time() + ttl,
+                  "digest": hashlib.sha1(body).hexdigest(),
+                  **(validators or {})}
+
+        keep = ttl + envs.REVALIDATE_TTL if body != NEGATIVE else ttl
+        self._backend.set(key, json.dumps(header).encode() + b"\n" + body,
+                          keep)
+
+    @staticmethod
+    def _fresh(header: dict, margin: float = 0) -> bool:
+        """The response does not expire in the next margin seconds."""
+        return header is not None \
+            and header["expires"] - margin > time.time()
+
+    def _decode(self, digest: str, body: bytes):
+        """Decodes a JSON body, reusing the data of an identical body decoded
+        recently."""
+        with self._decoded_lock:
+            if digest in self._decoded:
+                self._decoded.move_to_end(digest)
+                return self._decoded[digest]
+
+        data = json.loads(body)
+
+        with self._decoded_lock:
+            self._decoded[digest] = data
+            if len(self._decoded) > envs.DECODED_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+
+        return data
+
+    def _coalesce(self, key: str, timeout: float, load,
+                  margin: float = 0) -> tuple:
+        """Runs load() once for all the requests of the same key, waiting for
+        the result of another thread or another bot process if it is already
+        loading it.
 
         Args:
-            orgname (str, optional): The name of the organization.
-            tags (str, optional): some tags.
+            key (str): the cache key of the response
+            timeout (float): how long to wait for another loader
+            load (Callable): downloads the response and caches it
+            margin (float, optional): a cached response expiring in less
+                than margin seconds is loaded again.
 
         Returns:
-            str: Results with MD syntax
+            tuple: (status code, body, data or None if not decoded yet)
         """
-        url = f"{self._url}/{envs.ORGNAMEGPSPUBLIC}"
-
-        filters = {}
-        if orgname:
-            filters["orgname"] = orgname
-
-        if tags:
-            filters["tags"] = tags
-
-        if not filters:
-            return content.ORGNAME_DEFAULT
-
-        resp = self._get(url, filters=filters)
-        data = resp.json()["results"]
+        with self._flight(key):
+            header, body = self._read(key)
+            if self._fresh(header, margin):  # loaded while waiting
+                metrics.incr("cache_coalesced")
+                return 200, body, None
+
+            lock = f"{key}:lock"
+            owner = uuid.uuid4().hex.encode()
+            acquired = self._backend.add(lock, owner, timeout)
+            deadline = time.monotonic() + timeout
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(0.05)  # loading in another process
+                # read before the response, which is cached before the
+                # lock is released
+                released = self._backend.get(lock) is None
+                header, body = self._read(key)
+                if self._fresh(header, margin):
+                    metrics.incr("cache_coalesced")
+                    return 200, body, None
+                if released:  # its load failed
+                    acquired = self._backend.add(lock, owner, timeout)
+            # given up: loaded here, and the lock taken if it expired
+            if not acquired:
+                acquired = self._backend.add(lock, owner, timeout)
+
+            try:
+                return load()
+            finally:  # never the lock of another process
+                if acquired and self._backend.get(lock) == owner:
+                    self._backend.delete(lock)
+
+    @contextmanager
+    def _flight(self, key: str):
+        """Holds the lock of a key in this process, so that the threads
+        loading different keys never wait for each other."""
+        with self._flights_lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._flights_lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+    def request(self, path: str, token: str = None, id: str = "",
+                query: dict = None, url: str = None,
+                headers: dict = None,
+                limit: bool = False) -> requests.Response:
+        """Calls an endpoint of the registry with its timeout and retry
+        policies.
 
-        if not data:  # no result
-            return content.EMPTY
-
-        elif len(data) > envs.MAX_ITER_NUMBER:  # too much results
-            return content.too_much_data(data, "organisationname")
-
-        else:  # sends requested info
-            return content.data_message(data)
-
-    def weaponspublic(self) -> str:
-        """Allows a user to get information about space-related weapons
-        (not all details). (GET)
+        Args:
+            path (str): the endpoint, a key of endpoints.ENDPOINTS
+            token (str, optional): access token of the user.
+            id (str, optional): appended to the endpoint path.
+            query (dict, optional): API filters.
+            url (str, optional): overrides the endpoint url, eg: next page.
+            headers (dict, optional): additional headers.
+            limit (bool, optional): raises ResponseTooLarge if the body is
+                larger than the max_bytes of the endpoint.
 
         Returns:
-            str: Results with MD syntax
+            requests.Response
         """
-        url = f"{self._url}/{envs.WEAPONSPUBLIC}"
-        data = self._get(url).json()
-
-        if not data:  # no result
-            return content.EMPTY
-
-        return content.data_message(data)
-
-    def records(self) -> str:
-        """Allows a user to get an insight into the database content.
+        endpoint = ENDPOINTS[path]
+
+        if not url:
+            url = f"{self._url}/{endpoint.path}"
+            if id:
+                url += f"/{id}"
+
+        headers = dict(headers or {})
+        if endpoint.auth:
+            headers["Authorization"] = f"JWT {token}"
+
+        start = time.perf_counter()
+        try:
+            with metrics.timer("upstream_seconds", endpoint=path):
+                resp = self._get(url, headers=headers, filters=query,
+                                 timeout=endpoint.timeout,
+                                 retries=endpoint.retries,
+                                 max_bytes=endpoint.max_bytes if limit
+                                 else None)
+        except ResponseTooLarge as error:
+            if self.capture is not None:
+                self.capture.request(error.response.url,
+                                     error.response.status_code,
+                                     time.perf_counter() - start,
+                                     error.response.headers)
+            raise
+
+        if self.capture is not None:
+            self.capture.request(resp.url, resp.status_code,
+                                 time.perf_counter() - start, resp.headers,
+                                 resp.content)
+
+        metrics.incr("upstream_requests", endpoint=path,
+                     status=resp.status_code)
+        metrics.observe("response_bytes", len(resp.content), endpoint=path)
+        return resp
+
+    def _prepare(self, path: str, token: str, id: str, args: dict) -> tuple:
+        """Returns: tuple: (endpoint, API filters, id, cache key)"""
+        endpoint = ENDPOINTS[path]
+        query = endpoint.query(args)
+        id = str(id).strip() if endpoint.id != NO_ID else ""
+        key = self._cache_key(path, id, query, token if endpoint.auth
+                              and not endpoint.shared else None)
+        return endpoint, query, id, key
+
+    def _download(self, endpoint: Endpoint, key: str, token: str, id: str,
+                  query: dict) -> tuple:
+        """Downloads a response and caches it, revalidating the expired copy
+        if there is one.
 
         Returns:
-            str: Results with MD syntax
+            tuple: (status code, body, data or None if not decoded yet)
         """
-        url = f"{self._url}/{envs.RECORDS}"
-        data = self._get(url).json()
-
-        if not data:  # no result
-            return content.EMPTY
+        path = endpoint.path
+        header, body = self._read(key)
+
+        headers = {}
+        if header and body != NEGATIVE:
+            if header.get("etag"):
+                headers["If-None-Match"] = header["etag"]
+            if header.get("last_modified"):
+                headers["If-Modified-Since"] = header["last_modified"]
+
+        oversized = None
+        try:
+            resp = self.request(path, token, id, query, headers=headers,
+                                limit=True)
+        except ResponseTooLarge as error:
+            resp, oversized = error.response, error
+
+        if endpoint.auth and resp.status_code in (200, 304, 404):
+            self._seen_valid(token)
+
+        if resp.status_code == 304 and headers:
+            metrics.incr("cache_revalidated", endpoint=path)
+            self._write(key, body, endpoint.ttl, {
+                k: header[k] for k in ("etag", "last_modified", "truncated")
+                if k in header})
+            return 200, body, None
+
+        if resp.status_code == 404:
+            self._write(key, NEGATIVE, endpoint.negative_ttl)
+            return 404, NEGATIVE, None
 
-        return content.data_message(data)
+        if resp.status_code != 200:
+            resp.close()
+            return resp.status_code, None, None
 
-    def tag(self) -> str:
-        """Allows a user to get all tags available for filtering purposes.
+        truncated = False
+        if oversized is None:
+            body = resp.content
+        else:
+            body, truncated = self._stream(endpoint, oversized)
+        digest = hashlib.sha1(body).hexdigest()
+        unchanged = header is not None and header["digest"] == digest
+        if unchanged:
+            metrics.incr("cache_unchanged", endpoint=path)
+
+        data = self._decode(digest, body)
+        if _is_empty(data):
+            self._write(key, NEGATIVE, endpoint.negative_ttl)
+            return 200, NEGATIVE, None
+
+        if not unchanged:  # the listeners already have these records
+            self._publish(path, data)
+
+        if endpoint.ttl:
+            validators = {}
+            if resp.headers.get("ETag"):
+                validators["etag"] = resp.headers["ETag"]
+            if resp.headers.get("Last-Modified"):
+                validators["last_modified"] = resp.headers["Last-Modified"]
+            if truncated:  # kept with the validators, cut again if changed
+                validators["truncated"] = True
+            self._write(key, body, endpoint.ttl, validators)
+
+        return 200, body, data
+
+    def _stream(self, endpoint: Endpoint, error: ResponseTooLarge) -> tuple:
+        """The body of an oversized response, cut to its first records. A
+        body cut short has the shape of a page, with the number of records
+        of the whole body and "truncated": true.
 
         Returns:
-            str: Results with MD syntax
+            tuple: (body, True if records were dropped)
         """
-        url = f"{self._url}/{envs.TAG}"
-        data = self._get(url).json()
-
-        if not data:  # no result
-            return content.EMPTY
-
-        return content.data_message(data)
-
-    def myaccount(self, token: str) -> str:
-        """Once logged in, you can check your account details.
+        metrics.incr("upstream_oversized", endpoint=endpoint.path)
+        try:
+            data, total = _stream_records(error.head, error.chunks,
+                                          envs.STREAM_RECORDS,
+                                          endpoint.max_bytes)
+        except ValueError as parse_error:
+            raise requests.RequestException(
+                f"cannot stream {endpoint.path}: {parse_error}") from None
+        finally:
+            error.response.close()
+
+        records = data.get("results", []) if isinstance(data, dict) \
+            else data
+        truncated = total > len(records)
+        if truncated:
+            if not isinstance(data, dict):
+                data = {"count": total, "next": None, "previous": None,
+                        "results": records}
+            data.setdefault("count", total)
+            data["truncated"] = True
+
+        body = json.dumps(data).encode()
+        metrics.observe("response_bytes", len(body), endpoint=endpoint.path)
+        return body, truncated
+
+    def _revalidate_later(self, endpoint: Endpoint, key: str, token: str,
+                          id: str, query: dict) -> None:
+        """Downloads a response in a background thread, once per key even if
+        it is requested several times meanwhile."""
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(
+                    envs.REFRESH_WORKERS, thread_name_prefix="refresh")
+
+        def revalidate() -> None:
+            try:
+                self._coalesce(key, endpoint.timeout, lambda: self._download(
+                    endpoint, key, token, id, query))
+            except requests.RequestException:
+                metrics.incr("upstream_errors", endpoint=endpoint.path)
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+
+        metrics.incr("cache_stale_served", endpoint=endpoint.path)
+        self._refresher.submit(revalidate)
+
+    def refresh(self, path: str, token: str = None, id: str = "",
+                margin: float = 0, **args) -> bool:
+        """Downloads a response again unless the cached one is still fresh
+        for margin seconds, eg: to refresh it before it expires.
 
         Returns:
-            str: Results with MD syntax
+            bool: True if the response is cached
         """
-        url = f"{self._url}/{envs.ACCOUNT}"
-        headers = {"Authorization": f"JWT {token}"}
-
-        resp = self._get(url, headers=headers)
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
-
-    def orgname(self, id: int, token: str, orgname: str = "",
-                tags: str = "", has_satellite_named: str = "",
-                has_satellite_operated_by_country: str = "") -> str:
-        """Allows a user to get information about space organizations.
+        endpoint, query, id, key = self._prepare(path, token, id, args)
+        try:
+            status, _, _ = self._coalesce(
+                key, endpoint.timeout,
+                lambda: self._download(endpoint, key, token, id, query),
+                margin=margin)
+        except requests.RequestException:
+            metrics.incr("upstream_errors", endpoint=path)
+            return False
+
+        return status in (200, 404)
+
+    def peek(self, path: str, token: str = None, id: str = "",
+             **args) -> tuple:
+        """Gets the data of an endpoint of the registry from the cache only,
+        without calling recon.space. An expired response is still served
+        during the stale_ttl of the endpoint, while it is revalidated in the
+        background.
 
         Returns:
-            str: Results with MD syntax
+            tuple: see load(), None if the response is not cached
         """
-        if id:
-            url = f"{self._url}/{envs.ORGNAME}/"+str(id)
-            headers = {"Authorization": f"JWT {token}"}
-            resp = self._get(url, headers=headers)
-        else:
-
-            url = f"{self._url}/{envs.ORGNAME}"
-            headers = {"Authorization": f"JWT {token}"}
+        endpoint, query, id, key = self._prepare(path, token, id, args)
 
-            filters = {}
-            if orgname:
-                filters["orgname"] = orgname
+        if endpoint.default and not id and not query:
+            return endpoint.default, 0, None
 
-            if tags:
-                filters["tags"] = tags
+        if not endpoint.ttl and not endpoint.negative_ttl:
+            return None
 
-            if has_satellite_named:
-                filters["hassatellitenamed"] = has_satellite_named
+        if endpoint.shared and not self.trusted(token):
+            metrics.incr("cache_shared_untrusted", endpoint=path)
+            return None
 
-            if has_satellite_operated_by_country:
-                filters[
-                    "hassatelliteoperatedbycountry"
-                ] = has_satellite_operated_by_country
+        header, body = self._read(key)
+        if not self._fresh(header):
+            if not self._servable(endpoint, header, body):
+                return None
+            self._revalidate_later(endpoint, key, token, id, query)
 
-            resp = self._get(url, headers=headers, filters=filters)
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+        self._count(path, "cache_hit")
 
-    def orgnamegps(self, token: str, orgname: str = "",
-                   tags: str = "") -> str:
-        """Allows a user to get information about space organizations.
+        raw = urlencode(sorted(
+            (endpoint.filters[arg], value) for arg, value in args.items()
+            if arg in endpoint.filters and value), safe=",")
+        if raw != canonical(query):  # a miss without normalization
+            metrics.incr("cache_normalized_hit", endpoint=path)
 
-        Returns:
-            str: Results with MD syntax
-        """
-        url = f"{self._url}/{envs.ORGNAMEGPS}"
-        headers = {"Authorization": f"JWT {token}"}
+        if body == NEGATIVE:  # no result
+            metrics.incr("cache_negative_hit", endpoint=path)
+            return content.EMPTY, 0, None
+        if header.get("truncated"):  # its first records only
+            metrics.incr("cache_truncated_hit", endpoint=path)
 
-        filters = {}
-        if orgname:
-            filters["orgname"] = orgname
+        digest = header["digest"]
+        return self._decode(digest, body), len(body), digest
 
-        if tags:
-            filters["tags"] = tags
-
-        resp = self._get(url, headers=headers, filters=filters)
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
-
-    def satellite(self, token: str, name: str = "",
-                  country_operator: str = "", orbit: str = "",
-                  launch_vehicle: str = "") -> str:
-        """Allows a user to get information about satellites of a space
-        organization.
+    def cached(self, path: str, token: str = None, id: str = "",
+               **args) -> tuple:
+        """Gets the data of a fresh cached response, without counting a
+        cache hit nor revalidating it, eg: to plan a query.
 
         Returns:
-            str: Results with MD syntax
+            tuple: see load(), None if the response is not cached or
+                expired
         """
-        url = f"{self._url}/{envs.SATELLITE}"
-        headers = {"Authorization": f"JWT {token}"}
-
-        filters = {}
-        if name:
-            filters["satellitename"] = name
-
-        if country_operator:
-            filters["satellitecountryoperator"] = country_operator
-
-        if orbit:
-            filters["satelliteorbit"] = orbit
-
-        if launch_vehicle:
-            filters["satellitelaunchvehicle"] = launch_vehicle
-
-        resp = self._get(url, headers=headers, filters=filters)
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
-
-    def domain(self, token: str, id: int) -> str:
-        url = f"{self._url}/{envs.DOMAIN}/"+str(id)
-        headers = {"Authorization": f"JWT {token}"}
-        resp = self._get(url, headers=headers)
+        endpoint, query, id, key = self._prepare(path, token, id, args)
+        if endpoint.shared and not self.trusted(token):
+            return None
 
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+        header, body = self._read(key)
+        if not self._fresh(header):
+            return None
+        if body == NEGATIVE:  # no result
+            return content.EMPTY, 0, None
 
-    def subdomain(self, token: str, id: int) -> str:
-        url = f"{self._url}/{envs.SUBDOMAIN}/"+str(id)
-        headers = {"Authorization": f"JWT {token}"}
-        resp = self._get(url, headers=headers)
+        digest = header["digest"]
+        return self._decode(digest, body), len(body), digest
 
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
-
-    def ip(self, token: str, id: int) -> str:
-        url = f"{self._url}/{envs.IP}/"+str(id)
-        headers = {"Authorization": f"JWT {token}"}
-        resp = self._get(url, headers=headers)
-
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+    def load(self, path: str, token: str = None, id: str = "",
+             peeked: bool = False, **args) -> tuple:
+        """Gets the data of an endpoint of the registry, from the cache if
+        possible, see peek().
 
-    def taglaws(self, token: str) -> str:
-        url = f"{self._url}/{envs.TAGLAWS}"
-        headers = {"Authorization": f"JWT {token}"}
-        resp = self._get(url, headers=headers)
+        Args:
+            path (str): the endpoint, a key of endpoints.ENDPOINTS
+            token (str, optional): access token of the user, for connected
+                endpoints.
+            id (str, optional): appended to the endpoint path.
+            peeked (bool, optional): peek() just missed, the cache is not
+                read again before calling recon.space.
+            **args: command arguments, see Endpoint.filters
 
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+        Returns:
+            tuple: (data, size of the body in bytes, digest of the body).
+                data is the final message instead (str) when there is
+                nothing to render.
+        """
+        if not peeked:
+            cached = self.peek(path, token, id, **args)
+            if cached is not None:
+                return cached
+
+        endpoint, query, id, key = self._prepare(path, token, id, args)
+        self._count(path, "cache_miss")
+
+        try:
+            # an untrusted token is checked by recon.space itself
+            if endpoint.ttl and (not endpoint.shared
+                                 or self.trusted(token)):
+                status, body, data = self._coalesce(
+                    key, endpoint.timeout, lambda: self._download(
+                        endpoint, key, token, id, query))
+            else:
+                status, body, data = self._download(
+                    endpoint, key, token, id, query)
+        except requests.RequestException:
+            metrics.incr("upstream_errors", endpoint=path)
+            return content.API_ERROR, 0, None
+
+        if status not in (200, 404):
+            error = content.LOG_ERROR if endpoint.auth \
+                else content.API_ERROR
+            return error, 0, None
+
+        if body == NEGATIVE:  # no result
+            return content.EMPTY, 0, None
+
+        digest = hashlib.sha1(body).hexdigest()
+        if data is None:
+            data = self._decode(digest, body)
+
+        return data, len(body), digest
+
+    @staticmethod
+    def _servable(endpoint: Endpoint, header: dict, body: bytes) -> bool:
+        """An expired response can be served while it is revalidated."""
+        return header is not None and body != NEGATIVE \
+            and header["expires"] + endpoint.stale_ttl > time.time()
+
+    def _count(self, path: str, name: str) -> None:
+        """Counts a cache hit or miss and updates the hit rate."""
+        metrics.incr(name, endpoint=path)
+        hits = metrics.counter("cache_hit", endpoint=path)
+        misses = metrics.counter("cache_miss", endpoint=path)
+        metrics.gauge("cache_hit_rate", hits / (hits + misses), endpoint=path)
+
+    def pages(self, path: str, token: str = None, **args):
+        """Iterates over the results of every page of a paginated endpoint.
+
+        Yields:
+            list: the results of a page
+        """
+        endpoint = ENDPOINTS[path]
+        url = None
+        query = endpoint.query(args)
 
-    def weapons(self, token: str) -> str:
-        url = f"{self._url}/{envs.WEAPONS}"
-        headers = {"Authorization": f"JWT {token}"}
-        resp = self._get(url, headers=headers)
+        while True:
+            resp = self.request(path, token, query=query, url=url)
+            resp.raise_for_status()
+            data = resp.json()
 
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+            if not isinstance(data, dict):  # not paginated
+                yield data
+                return
 
-    def financial(self, token: str, id: int) -> str:
-        url = f"{self._url}/{envs.FINANCIAL}/"+str(id)
-        headers = {"Authorization": f"JWT {token}"}
-        resp = self._get(url, headers=headers)
+            yield data.get("results", [])
 
-        if resp.status_code == 200:
-            return content.data_message(resp.json())
-        else:
-            return content.LOG_ERROR
+            url = data.get("next")
+            query = None  # already part of the next url
+            if not url:
+                return
 
+    def page(self, path: str, number: int, token: str = None,
+             **args):
+        """Downloads a single page of a paginated endpoint, bypassing the
+        cache.
 
-api_instance = SpaceDataApi()
-api_instance.domain('your_token_here', 15)
+        Returns:
+            dict: the page, or the whole data if the endpoint is not
+                paginated
+        """
+        endpoint = ENDPOINTS[path]
+        query = endpoint.query(args)
+        if endpoint.pagination == PAGE_NUMBER:
+            query[envs.F_PAGE] = number
+
+        resp = self.request(path, token, query=query)
+        resp.raise_for_status()
+        return resp.json()
@@ -0,0 +1,354 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheError(Exception):
+    """Raised when the cache server answers with an error."""
+
+
+class CacheBackend:
+    """Key-value store shared by the API client: cached responses, tokens
+    and locks. Keys are strings and values are bytes; a ttl of 0 means the
+    value never expires.
+    """
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float = 0) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: float = 0) -> bool:
+        """Sets the value only if the key does not exist.
+
+        Returns:
+            bool: True if the value was set
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """Cache of a single bot process. Expired entries are removed when read,
+    and all at once every SWEEP_INTERVAL seconds, so that keys never read
+    again do not stay in memory."""
+    SWEEP_INTERVAL = 60  # seconds
+
+    def __init__(self) -> None:
+        self._data = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + self.SWEEP_INTERVAL
+
+    def _sweep(self) -> None:
+        """Removes the expired entries, with the lock held."""
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        expired = [key for key, (expires, _) in self._data.items()
+                   if expires and expires <= now]
+        for key in expired:
+            del self._data[key]
+
+    def _alive(self, key: str) -> bool:
+        entry = self._data.get(key)
+        if entry is None:
+            return False
+
+        if entry[0] and entry[0] <= time.monotonic():
+            del self._data[key]
+            return False
+
+        return True
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            if self._alive(key):
+                return self._data[key][1]
+
+    def set(self, key: str, value: bytes, ttl: float = 0) -> None:
+        expires = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            self._sweep()
+            self._data[key] = (expires, value)
+
+    def add(self, key: str, value: bytes, ttl: float = 0) -> bool:
+        expires = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            self._sweep()
+            if self._alive(key):
+                return False
+
+            self._data[key] = (expires, value)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    """Cache shared by several bot processes through a server speaking the
+    Redis protocol (RESP). If the server is unreachable, reads are misses
+    and writes are dropped, so the bot keeps working on its own.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379,
+                 db: int = 0, password: str = None,
+                 timeout: float = 1.0) -> None:
+        self._address = (host, port)
+        self._db = db
+        self._password = password
+        self._timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection(self._address, self._timeout)
+        self._file = self._sock.makefile("rb")
+
+        if self._password:
+            self._send("AUTH", self._password)
+        if self._db:
+            self._send("SELECT", self._db)
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._file = None
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("connection closed by the cache server")
+
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise CacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            return None if size < 0 else self._file.read(size + 2)[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._read() for _ in range(size)]
+
+        raise CacheError(f"unexpected reply: {line!r}")
+
+    def _send(self, *args):
+        args = [a if isinstance(a, bytes) else str(a).encode() for a in args]
+        payload = b"*%d\r\n" % len(args) + b"".join(
+            b"$%d\r\n%s\r\n" % (len(a), a) for a in args)
+
+        self._sock.sendall(payload)
+        return self._read()
+
+    def _command(self, *args):
+        with self._lock:
+            for attempt in range(2):  # reconnects once
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(*args)
+                except OSError as error:
+                    self._close()
+                    if attempt:
+                        logger.warning("cache server unavailable: %s", error)
+                        raise
+
+    def get(self, key: str) -> bytes:
+        try:
+            return self._command("GET", key)
+        except OSError:
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float = 0) -> None:
+        args = ["SET", key, value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+
+        try:
+            self._command(*args)
+        except OSError:
+            pass
+
+    def add(self, key: str, value: bytes, ttl: float = 0) -> bool:
+        args = ["SET", key, value, "NX"]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+
+        try:
+            return self._command(*args) == "OK"
+        except OSError:
+            return True  # nobody to coordinate with
+
+    def delete(self, key: str) -> None:
+        try:
+            self._command("DEL", key)
+        except OSError:
+            pass
+
+
+def from_url(url: str) -> CacheBackend:
+    """Creates the backend described by envs.CACHE_URL, eg:
+    redis://:password@localhost:6379/0. An empty url gives a MemoryBackend.
+    """
+    if not url:
+        return MemoryBackend()
+
+    parsed = urlparse(url)
+    if parsed.scheme != "redis":
+        raise ValueError(f"unsupported cache url: {url}")
+
+    return RedisBackend(host=parsed.hostname or "localhost",
+                        port=parsed.port or 6379,
+                        db=int(parsed.path.strip("/") or 0),
+                        password=parsed.password)
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    """Local server speaking enough of the Redis protocol for RedisBackend
+    (PING, AUTH, SELECT, GET, SET, DEL, FLUSHDB), to test several bot
+    processes without a Redis install.
+
+    eg: with StandInServer() as server:
+            backend = RedisBackend(*server.server_address)
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _StandInHandler)
+        self.store = MemoryBackend()
+        self.connections = set()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def disconnect(self) -> None:
+        """Closes the connections of the clients, as a restarted server."""
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        super().__exit__(*args)
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+
+    def _read_command(self) -> list:
+        line = self.rfile.readline()
+        if not line:
+            return None
+
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _execute(self, args: list) -> bytes:
+        store = self.server.store
+        name = args[0].upper()
+
+        if name in (b"PING", b"AUTH", b"SELECT"):
+            return b"+OK\r\n" if name != b"PING" else b"+PONG\r\n"
+
+        if name == b"GET":
+            value = store.get(args[1].decode())
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+
+        if name == b"SET":
+            key, value = args[1].decode(), args[2]
+            options = [a.upper() for a in args[3:]]
+            ttl = 0
+            if b"PX" in options:
+                ttl = int(options[options.index(b"PX") + 1]) / 1000
+            if b"EX" in options:
+                ttl = int(options[options.index(b"EX") + 1])
+
+            if b"NX" in options:
+                return b"+OK\r\n" if store.add(key, value, ttl) \
+                    else b"$-1\r\n"
+
+            store.set(key, value, ttl)
+            return b"+OK\r\n"
+
+        if name == b"DEL":
+            for key in args[1:]:
+                store.delete(key.decode())
+            return b":%d\r\n" % (len(args) - 1)
+
+        if name == b"FLUSHDB":
+            self.server.store = MemoryBackend()
+            return b"+OK\r\n"
+
+        return b"-ERR unknown command\r\n"
+
+    def handle(self) -> None:
+        self.server.connections.add(self.connection)
+        try:
+            while True:
+                args = self._read_command()
+                if not args:
+                    return
+                self.wfile.write(self._execute(args))
+        except OSError:  # disconnected
+            pass
+        finally:
+            self.server.connections.discard(self.connection)
+
+
+if __name__ == "__main__":
+    with StandInServer() as server:
+        first = RedisBackend(*server.server_address)
+        second = RedisBackend(*server.server_address)
+
+        first.set("key", b"value", ttl=1)
+        assert second.get("key") == b"value"
+        assert not second.add("key", b"other")
+        second.delete("key")
+        assert first.get("key") is None
+        print("RedisBackend OK")
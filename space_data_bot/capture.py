@@ -0,0 +1,156 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Capture of the traffic of the bot, replayed by space_data_bot.replay.
+
+Set SPACEDATA_CAPTURE to a file to record, as JSON lines:
+- the Discord commands, their arguments and when they arrived, the users
+  being replaced by an HMAC of their id with a random salt, never written,
+  so that they cannot be found from the member list of the guild;
+- the recon.space requests made for them, their duration and the response,
+  tokens and personal fields being redacted.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlparse
+
+from space_data_bot import envs
+from space_data_bot.endpoints import canonical
+
+
+# never written to a capture, at any depth of a body or in the arguments
+REDACTED_KEYS = {"access", "refresh", "token", "password", "email",
+                 "username", "first_name", "last_name", "phone"}
+REDACTED = "<redacted>"
+# replaces the API root in the recorded bodies, eg: in the next page urls
+API_ROOT = "$API_ROOT"
+
+
+def redact(data):
+    """A copy of JSON data without the values of REDACTED_KEYS."""
+    if isinstance(data, dict):
+        return {key: REDACTED if key in REDACTED_KEYS else redact(value)
+                for key, value in data.items()}
+    if isinstance(data, list):
+        return [redact(value) for value in data]
+    return data
+
+
+def request_key(path: str, query: str) -> str:
+    """Identifies a request whatever the API root, the order and the case of
+    its filters, eg: ("/myapi/satellite/", "page=2") -> "satellite?page=2"
+    """
+    path = path.strip("/").split("/", 1)[-1].strip("/")
+    query = canonical(dict(parse_qsl(query)))
+    return f"{path}?{query}" if query else path
+
+
+class Capture:
+    """Appends the commands and the requests of the bot to a JSON lines
+    file, each event with its offset in seconds from the capture start.
+
+    eg: {"t": 0.12, "type": "command", "command": "satellite",
+         "user": "5d41402a", "args": {"orbit": "GEO"}}
+        {"t": 0.13, "type": "request", "key": "satellite?satelliteorbit=geo",
+         "status": 200, "seconds": 0.4, "size": 5120, "etag": null,
+         "body": {...}}
+    """
+
+    def __init__(self, path: str, max_body: int = envs.CAPTURE_BODY_BYTES
+                 ) -> None:
+        """
+        Args:
+            path (str): the capture file, appended to if it exists.
+            max_body (int, optional): larger bodies are only described by
+                their size, the replay answers them with synthetic records.
+        """
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._max_body = max_body
+        # a user keeps the same id until the bot restarts
+        self._salt = os.urandom(16)
+
+    def _write(self, event: dict) -> None:
+        event = {"t": round(time.monotonic() - self._start, 4), **event}
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def command(self, name: str, user: int, args: dict) -> None:
+        """Records a Discord command when it arrives."""
+        user = hmac.new(self._salt, str(user).encode(),
+                        hashlib.sha256).hexdigest()[:8]
+        self._write({"type": "command", "command": name, "user": user,
+                     "args": redact(args)})
+
+    def request(self, url: str, status: int, seconds: float, headers: dict,
+                body: bytes = None) -> None:
+        """Records a recon.space response.
+
+        Args:
+            url (str): the url requested, with its filters.
+            status (int): the status code.
+            seconds (float): the duration of the request.
+            headers (dict): the response headers.
+            body (bytes, optional): None if it was too large to be read.
+        """
+        parsed = urlparse(url)
+        event = {"type": "request",
+                 "key": request_key(parsed.path, parsed.query),
+                 "status": status, "seconds": round(seconds, 4),
+                 "size": len(body) if body is not None else None,
+                 "etag": headers.get("ETag"), "body": None}
+
+        if body and len(body) <= self._max_body:
+            try:
+                event["body"] = redact(json.loads(body.replace(
+                    envs.API_ROOT.encode(), API_ROOT.encode())))
+            except ValueError:  # not JSON, replayed as synthetic records
+                pass
+
+        self._write(event)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def from_env() -> Capture:
+    """The capture set by envs.CAPTURE_PATH, None if disabled."""
+    return Capture(envs.CAPTURE_PATH) if envs.CAPTURE_PATH else None
+
+
+def read(path: str) -> list[dict]:
+    """The events of a capture file, in order."""
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -27,6 +27,7 @@ from space_data_bot import envs, utils
 
 
 EMPTY = "Sorry, nothing matches your search..."
+API_ERROR = "recon.space did not answer, please try again later."
 LOT_OF_DATA = """
 There's a lot of data!
 Here's a sample of what you can get with this command:
@@ -36,6 +37,19 @@ There are more than 5 companies that contain this filter!
 Try refining your search by entering one of these names:
 """
 
+MIRROR_LOADING = """
+The local copy of recon.space is still loading, please try again in a few
+minutes.
+"""
+VIEW_SET = "Your results will now be displayed as {view}."
+TABLE_MORE = "_{count} more records, refine your search or pick fewer columns..._"
+CROPPED = "_Cropped: only the first {shown} of {count} records were downloaded, refine your search..._"
+TAG_SEARCH_ERROR = """
+{error}
+Combine tags with AND, OR, NOT and parentheses, and quote the tags holding
+these words, eg: `Agency AND NOT (Misc OR "Not Applicable")`
+"""
+
 # LOGIN
 
 LOG_SUCCESS = "You are successfully logged in!"
@@ -106,25 +120,13 @@ the command.
 """
 
 # HELP DOCUMENTATION
-HELP_PUBLIC_ENDPOINTS = {
+# commands outside of the endpoints registry, the others are described by
+# their Endpoint.doc
+HELP_COMMANDS = {
     envs.TOKEN: "Allows a user to connect to their account; an access token and a refresh token are provided.",
-    envs.RECORDS: "Allows a user to get an insight into the database content.",
-    envs.ORGNAMEPUBLIC: "Allows a user to get information about space organizations (50% of DB content).",
-    envs.ORGNAMEGPSPUBLIC: "Allows a user to get information about the localization of space organizations (33% of DB content).",
-    envs.WEAPONSPUBLIC: "Allows a user to get information about space-related weapons (not all details).",
-    envs.TAG: "Allows a user to get all tags available for filtering purposes."
-}
-HELP_PRIVATE_ENDPOINTS = {
-    envs.ACCOUNT: "Once logged in, you can check your account details.",
-    envs.ORGNAME: "Allows a user to get information about space organizations.",
-    envs.ORGNAMEGPS: "Allows a user to get information about space organizations.",
-    envs.DOMAIN: "Allows a user to get information about domains owned by a space organization.",
-    envs.SUBDOMAIN: "Allows a user to get information about sub-domains used by a space organization.",
-    envs.IP: "Allows a user to get information about IP addresses used by a space organization.",
-    envs.SATELLITE: "Allows a user to get information about satellites of a space organization.",
-    envs.TAGLAWS: "Allows a user to get information of potential laws and guidelines to which a space organization is subject.",
-    envs.WEAPONS: "Allows a user to get information about space-related weapons.",
-    envs.FINANCIAL: "Allows a user to get information about finance of a space organization."
+    "tagsearch": "Allows a user to search space organizations with a tag expression, eg: Agency AND NOT Misc.",
+    "stats": "Allows a user to count organizations per tag or type, and once connected, satellites per orbit, country or launch vehicle.",
+    "view": "Allows a user to display results as detailed records or as a compact table, eg: with columns organisationname,tags."
 }
 
 
@@ -135,14 +137,19 @@ def _iter_help(data: dict) -> str:
     return message
 
 
-def help_message():
+def help_message(public: dict, private: dict) -> str:
+    """
+    Args:
+        public (dict): command -> description, for everyone
+        private (dict): command -> description, for connected users
+    """
     return f"""
 **Endpoints accessible for everyone**
-{_iter_help(HELP_PUBLIC_ENDPOINTS)}
+{_iter_help(public)}
 
 **Endpoints accessible for connected users**
 _These commands require you to be connected to `recon.space`._
-{_iter_help(HELP_PRIVATE_ENDPOINTS)}
+{_iter_help(private)}
 """
 
 
@@ -155,11 +162,9 @@ def data_message(data: list) -> str:
     Breaks down the result of a request and converts it into a Discord message.
     """
     # The maximum length of a Discord message is 2000 characters.
-    try:
-        data.pop("next")
-        data.pop("previous")
-    except BaseException:
-        pass
+    if isinstance(data, dict):  # copy, data may be cached
+        data = {k: v for k, v in data.items()
+                if k not in ("next", "previous")}
 
     message = f"""
     ```json
@@ -174,6 +179,150 @@ def data_message(data: list) -> str:
     return message
 
 
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        value = ",".join(str(elem) for elem in value)
+
+    value = " ".join(str(value).split())  # one line
+    if len(value) > envs.TABLE_CELL_WIDTH:
+        value = value[:envs.TABLE_CELL_WIDTH - 1] + "…"
+    return value
+
+
+def table_message(data, columns: tuple = ()) -> str:
+    """Breaks down records into an aligned table, which fits several times
+    more records in a message than data_message. Long values are
+    abbreviated.
+
+    Args:
+        data (list | dict): the records, a paginated response or a record
+        columns (tuple, optional): keys to show, every key of the first
+            record by default
+    """
+    if isinstance(data, dict):
+        data = data.get("results", [data])
+
+    if not isinstance(data, list) or \
+            not all(isinstance(elem, dict) for elem in data):
+        return data_message(data)
+
+    if not data:  # no result
+        return EMPTY
+
+    columns = [key for key in columns if key in data[0]] or list(data[0])
+    if not columns:  # records without any key
+        return data_message(data)
+
+    # a row takes at least 3 characters per column, no need to look further
+    rows = [[_cell(elem.get(key)) for key in columns] for elem in
+            data[:envs.MAX_MESSAGE_LENGTH // (3 * len(columns))]]
+    widths = [max(len(key), *(len(row[i]) for row in rows))
+              for i, key in enumerate(columns)]
+
+    def line(cells: list) -> str:
+        return " ".join(f"{cell:<{width}}" for cell, width
+                        in zip(cells, widths)).rstrip()
+
+    lines = [line(columns), line(["-" * width for width in widths])]
+    # room is kept for the code block and the count of the missing records
+    length = len(lines[0]) + len(lines[1]) + len(TABLE_MORE) + 16
+    for row in rows:
+        text = line(row)
+        length += len(text) + 1
+        if length > envs.MAX_MESSAGE_LENGTH:
+            break
+        lines.append(text)
+
+    table = "\n".join(lines)
+    message = f"```\n{table}\n```"
+    if len(lines) - 2 < len(data):
+        message += TABLE_MORE.format(count=len(data) - len(lines) + 2)
+
+    return message
+
+
+def cropped_notice(message: str, data) -> str:
+    """Adds a notice to a message rendered from a response cut to its first
+    records, see SpaceDataApi._stream."""
+    if not isinstance(data, dict) or not data.get("truncated"):
+        return message
+
+    notice = CROPPED.format(shown=len(data.get("results", [])),
+                            count=data.get("count", "?"))
+    room = 2000 - len(notice) - 1
+    if len(message) > room:  # cut after the last complete line
+        message = message[:message.rfind("\n", 0, room)]
+    return f"{message}\n{notice}"
+
+
+def results_message(data: dict) -> str:
+    """Breaks down a paginated organization search, only listing the names
+    when there are too many results.
+    """
+    if isinstance(data, dict):
+        data = data.get("results", [])
+
+    if not data:  # no result
+        return EMPTY
+
+    elif len(data) > envs.MAX_ITER_NUMBER:  # too much results
+        return too_much_data(data, "organisationname")
+
+    else:  # sends requested info
+        return data_message(data)
+
+
+def tag_search_message(count: int, data: list) -> str:
+    """Breaks down the result of a tag search, data being the first
+    matching records."""
+    if not count:
+        return EMPTY
+
+    return f"**{count} organizations match.**\n{results_message(data)}"
+
+
+def stats_message(name: str, total: int, counts: list) -> str:
+    """Breaks down counts of records per value.
+
+    Args:
+        name (str): what is counted, eg: "satellites per orbit"
+        total (int): number of records counted
+        counts (list): (value, count) to display
+    """
+    if not total:
+        return EMPTY
+
+    width = max((len(str(value)) for value, _ in counts), default=0)
+    lines = "\n".join(f"{str(value):<{width}}  {count}"
+                      for value, count in counts)
+
+    return utils.crop(f"**{name}** (out of {total})\n```\n{lines}\n```")
+
+
+def changes_message(name: str, new: list, changed: list) -> str:
+    """Announces the records added or modified on recon.space.
+
+    Args:
+        name (str): what changed, eg: "organisations"
+        new (list): the new records
+        changed (list): the modified records
+    """
+    def titles(data: list) -> str:
+        return ", ".join(str(elem.get("organisationname")
+                             or elem.get(envs.F_SATNAME)
+                             or elem.get("name")) for elem in data)
+
+    message = f"**recon.space updated its {name}**"
+    if new:
+        message += f"\n{len(new)} new: {titles(new)}"
+    if changed:
+        message += f"\n{len(changed)} changed: {titles(changed)}"
+
+    return utils.crop(message)
+
+
 def conform_data(data: list):
     if isinstance(data, dict):  # we need a list at the end
         data = data.get("results")
@@ -187,8 +336,9 @@ def conform_data(data: list):
     if len(str_data) > envs.MAX_MESSAGE_LENGTH:
         str_data = str_data[:envs.MAX_MESSAGE_LENGTH]
 
-        while str_data and str_data[-1] != "}" and str_data[-1] != "]":
-            str_data = str_data[:-1]
+        # cut after the last complete element
+        end = max(str_data.rfind("}"), str_data.rfind("]"))
+        str_data = str_data[:end + 1]
 
         try:
             return eval(str_data + "]")  # that is why we need a list
@@ -206,11 +356,15 @@ def too_much_data(data: list, filter: str) -> str:
         data (list): the request results
         filter (str): dictionary key to filter results
     """
-    message = TOO_MUCH_DATA
+    lines = [TOO_MUCH_DATA]
+    length = len(TOO_MUCH_DATA)
     for elem in data:
-        message += f"\n_{elem.get(filter, '')}_"
+        if length > 2000:  # cropped by utils.crop anyway
+            break
+        lines.append(f"_{elem.get(filter, '')}_")
+        length += len(lines[-1]) + 1
 
-    return utils.crop(message)
+    return utils.crop("\n".join(lines))
 
 
 if __name__ == "__main__":
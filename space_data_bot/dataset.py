@@ -0,0 +1,411 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from space_data_bot import envs, snapshot
+from space_data_bot.api import SpaceDataApi
+from space_data_bot.metrics import metrics
+from space_data_bot.records import SCHEMAS, RecordStore, tags
+from space_data_bot.stats import STATS_KEYS, Aggregates
+from space_data_bot.tagindex import TagIndex
+
+
+logger = logging.getLogger(__name__)
+
+# public endpoints mirrored in memory
+MIRRORED = (envs.ORGNAMEPUBLIC, envs.ORGNAMEGPSPUBLIC, envs.WEAPONSPUBLIC)
+# endpoints mirrored with the account of envs.MIRROR_EMAIL, or filled with
+# the pages users get from them
+CONNECTED_MIRRORED = (envs.SATELLITE,)
+
+
+class Dataset:
+    """recon.space datasets held in memory, with their indexes and
+    aggregates."""
+
+    def __init__(self, paths: tuple = MIRRORED + CONNECTED_MIRRORED) -> None:
+        self.stores = {path: RecordStore(SCHEMAS[path]) for path in paths}
+        self.tag_indexes = {path: TagIndex() for path, store
+                            in self.stores.items() if "tags" in store.columns}
+        self.stats = {path: Aggregates(STATS_KEYS[path]) for path in paths
+                      if path in STATS_KEYS}
+        self.complete = set()  # endpoints holding every record
+        self.synced = 0.0  # time of the download of the complete endpoints
+
+    def add(self, path: str, data: list[dict]) -> list[int]:
+        """Adds or replaces records and updates the indexes.
+
+        Returns:
+            list[int]: the positions of the records
+        """
+        store = self.stores[path]
+        index = self.tag_indexes.get(path)
+        stats = self.stats.get(path)
+        result = []
+
+        for elem in data:
+            old_tags = ()
+            position = store.position(elem.get(store.key))
+            if position is not None:
+                if index is not None:
+                    old_tags = store.columns["tags"].tag_ids(position)
+                if stats is not None:
+                    stats.remove({key: store.columns[key][position]
+                                  for key in stats.counts})
+
+            position = store.add(elem)
+            if index is not None:
+                index.set(position, store.columns["tags"].tag_ids(position),
+                          old_tags)
+            if stats is not None:
+                stats.add(elem)
+            result.append(position)
+
+        return result
+
+    def updated(self, pages: list[tuple]):
+        """A new version of the dataset with some records added or replaced,
+        this one being left unchanged for its readers. Only the stores of
+        the endpoints modified are copied, the others are shared.
+
+        Args:
+            pages (list[tuple]): (endpoint, records)
+        """
+        dataset = copy.copy(self)
+        dataset.stores = dict(self.stores)
+        dataset.tag_indexes = dict(self.tag_indexes)
+        dataset.stats = dict(self.stats)
+        dataset.complete = set(self.complete)
+
+        for path in {path for path, _ in pages}:
+            dataset.stores[path] = self.stores[path].copy()
+            if path in self.tag_indexes:
+                dataset.tag_indexes[path] = self.tag_indexes[path].copy()
+            if path in self.stats:
+                dataset.stats[path] = self.stats[path].copy()
+
+        for path, data in pages:
+            dataset.add(path, data)
+        return dataset
+
+    def select_tags(self, path: str, expression: str) -> int:
+        """Evaluates a tag expression over the records of an endpoint, see
+        tagindex.parse().
+
+        Returns:
+            int: the bitmap of the matching positions
+        """
+        return self.tag_indexes[path].select(expression)
+
+    @classmethod
+    def download(cls, api: SpaceDataApi, token: str = None):
+        """Downloads every page of the public endpoints, and of the
+        connected ones if a token is given. Blocking, to be run in a thread.
+        """
+        data, _, _ = api.load(envs.TAG)
+        if isinstance(data, list):  # known tags first, even if unused
+            for tag in data:
+                tags.id(tag.get("name", "") if isinstance(tag, dict)
+                        else str(tag))
+
+        dataset = cls()
+        dataset.synced = time.time()
+        for path in MIRRORED + (CONNECTED_MIRRORED if token else ()):
+            for page in api.pages(path, token):
+                dataset.add(path, page)
+            dataset.complete.add(path)
+
+            store = dataset.stores[path]
+            missing = [key for key, _ in store.schema if key not in store.seen]
+            if len(store) and missing:  # kept in the "extra" column instead
+                logger.warning("%s records have no %s key, check "
+                               "records.SCHEMAS", path, ", ".join(missing))
+
+        return dataset
+
+
+def build_snapshot(token: str, file: str) -> None:
+    """Downloads the dataset and saves its snapshot, in a worker process so
+    that parsing does not slow the bot down."""
+    snapshot.save(Dataset.download(SpaceDataApi(), token), file)
+
+
+class Versions:
+    """Holds the successive versions of a dataset. A new version is built
+    aside and published with a single reference swap: readers never see a
+    half-built one and never wait for a lock held during a build.
+
+    A reader keeps the version it started with until it is done, and an old
+    version is released once its last reader is.
+    """
+
+    def __init__(self) -> None:
+        self._current = (0, None)  # (version number, dataset)
+        self._readers = {}  # version number -> readers
+        self._retired = {}  # version number -> old dataset still read
+        self._lock = threading.Lock()  # held for a few operations only
+
+    @property
+    def current(self):
+        """The last dataset published, None if there is none yet."""
+        return self._current[1]
+
+    @property
+    def number(self) -> int:
+        return self._current[0]
+
+    @contextmanager
+    def read(self):
+        """Gives the current dataset (or None) for the time of a query."""
+        with self._lock:
+            number, dataset = self._current
+            self._readers[number] = self._readers.get(number, 0) + 1
+
+        try:
+            yield dataset
+        finally:
+            with self._lock:
+                self._readers[number] -= 1
+                if not self._readers[number]:
+                    del self._readers[number]
+                    self._release(number)
+
+    def publish(self, dataset) -> int:
+        """Replaces the current dataset.
+
+        Returns:
+            int: the number of the new version
+        """
+        with self._lock:
+            old_number, old = self._current
+            self._current = (old_number + 1, dataset)
+            if old is not None:
+                self._retired[old_number] = old
+                if old_number not in self._readers:
+                    self._release(old_number)
+
+        metrics.gauge("dataset_version", old_number + 1)
+        return old_number + 1
+
+    def _release(self, number: int) -> None:
+        """Drops an old version, with the lock held."""
+        if self._retired.pop(number, None) is not None:
+            metrics.incr("dataset_versions_released")
+        metrics.gauge("dataset_versions_retained", len(self._retired))
+
+
+class Mirror:
+    """Keeps a Dataset in sync with recon.space in the background. Commands
+    read it with `with mirror.versions.read() as dataset:` and must handle a
+    dataset not loaded yet (None).
+
+    The records fetched by users are added to a copy of the current version,
+    published once they are all added, so a query never sees a record half
+    added. During a sync they are held back and added to the new version
+    before it is published.
+    """
+
+    def __init__(self, api: SpaceDataApi,
+                 interval: float = envs.MIRROR_INTERVAL) -> None:
+        self._api = api
+        self._interval = interval
+        self._task = None
+        self._loop = None
+        self._pending = []  # pages fetched by users, not published yet
+        self._syncing = False
+        self._merging = None  # task publishing the pending pages
+        self.versions = Versions()
+        api.subscribe(self._on_page)
+
+    @property
+    def dataset(self) -> Dataset:
+        return self.versions.current
+
+    def _login(self) -> str:
+        if not envs.MIRROR_EMAIL:
+            return None
+
+        self._api.connect(envs.MIRROR_EMAIL, envs.MIRROR_PASSWORD,
+                          id=envs.MIRROR_USER_ID)
+        return self._api.get_token(envs.MIRROR_USER_ID)
+
+    async def restore(self) -> float:
+        """Maps the last snapshot, if no dataset is loaded yet.
+
+        Returns:
+            float: seconds before the snapshot is due for a sync
+        """
+        loaded = None
+        if self.versions.current is None and envs.SNAPSHOT_PATH:
+            loaded = await asyncio.to_thread(snapshot.load,
+                                             envs.SNAPSHOT_PATH, Dataset)
+        if loaded is None:
+            return 0
+
+        dataset, created = loaded
+        self.versions.publish(dataset)
+        return max(0, created + self._interval - time.time())
+
+    async def sync(self) -> None:
+        if self._merging is not None:  # its version is the one refreshed
+            await self._merging
+        self._syncing = True
+        try:
+            token = await asyncio.to_thread(self._login)
+            old = self.versions.current  # not modified during the sync
+
+            if envs.SNAPSHOT_PATH:  # parsed in a process, then mapped here
+                await asyncio.to_thread(self._build, token)
+                dataset = await asyncio.to_thread(self._restore_snapshot,
+                                                  token, old)
+            else:
+                dataset = await asyncio.to_thread(self._download, token,
+                                                  old)
+
+            pending, self._pending = self._pending, []
+            for path, data in pending:  # not published yet, added in place
+                dataset.add(path, data)
+            self.versions.publish(dataset)
+        finally:
+            self._syncing = False
+            self._merge_later()  # the pages held during a failed sync
+
+    @staticmethod
+    def _build(token: str) -> None:
+        """Runs build_snapshot in a new interpreter, killed after
+        MIRROR_BUILD_TIMEOUT seconds. A forked process would copy the locks
+        held by the threads of the bot and could deadlock, and a process
+        spawned by multiprocessing would import the bot again. The token is
+        passed on stdin, out of the process list, and the traffic of the
+        build is not captured. Blocking, to be run in a thread.
+
+        Raises:
+            subprocess.SubprocessError: the build failed or timed out
+        """
+        subprocess.run(
+            [sys.executable, "-m", "space_data_bot.dataset",
+             envs.SNAPSHOT_PATH, "--root", envs.API_ROOT],
+            input=(token or "").encode(), check=True,
+            env={**os.environ, "SPACEDATA_CAPTURE": ""},
+            timeout=envs.MIRROR_BUILD_TIMEOUT)
+
+    @staticmethod
+    def _keep_fetched(dataset: Dataset, token: str, old: Dataset) -> None:
+        """Keeps the records fetched by users if the mirror could not
+        download them itself."""
+        if old is not None and not token:
+            for path in CONNECTED_MIRRORED:
+                dataset.add(path, old.stores[path].to_dicts())
+
+    def _download(self, token: str, old: Dataset) -> Dataset:
+        """Blocking, to be run in a thread."""
+        dataset = Dataset.download(self._api, token)
+        self._keep_fetched(dataset, token, old)
+        return dataset
+
+    def _restore_snapshot(self, token: str, old: Dataset) -> Dataset:
+        """Blocking, to be run in a thread."""
+        dataset, _ = snapshot.load(envs.SNAPSHOT_PATH, Dataset)
+        self._keep_fetched(dataset, token, old)
+        return dataset
+
+    def _on_page(self, path: str, data: list[dict]) -> None:
+        """Adds the records fetched by users to the dataset, from the thread
+        of the request."""
+        if self._loop is not None and path in CONNECTED_MIRRORED:
+            self._loop.call_soon_threadsafe(self._add, path, data)
+
+    def _add(self, path: str, data: list[dict]) -> None:
+        if self._syncing or self.versions.current is not None:
+            self._pending.append((path, data))
+            self._merge_later()
+
+    def _merge_later(self) -> None:
+        if self._pending and not self._syncing and self._merging is None \
+                and self.versions.current is not None:
+            self._merging = self._loop.create_task(self._merge(),
+                                                   name="mirror-merge")
+
+    async def _merge(self) -> None:
+        """Publishes a new version with the pending pages, copied aside in a
+        thread. The pages of the next MIRROR_MERGE_DELAY seconds are merged
+        together, eg: all the pages of a command."""
+        try:
+            await asyncio.sleep(envs.MIRROR_MERGE_DELAY)
+            while self._pending and not self._syncing:
+                pending, self._pending = self._pending, []
+                dataset = await asyncio.to_thread(
+                    self.versions.current.updated, pending)
+                self.versions.publish(dataset)
+        finally:
+            self._merging = None
+
+    async def _run(self) -> None:
+        try:  # no download after a restart
+            await asyncio.sleep(await self.restore())
+        except Exception:
+            logger.exception("mirror snapshot failed to load")
+
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("mirror synchronization failed")
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run(), name="mirror")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._merging is not None:
+            self._merging.cancel()
+
+
+if __name__ == "__main__":
+    # Builds the snapshot of Mirror.sync, with the token read from stdin
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Downloads the mirror and saves its snapshot.")
+    parser.add_argument("file", help="the snapshot file")
+    parser.add_argument("--root", default=envs.API_ROOT,
+                        help="the API root, eg: of a mock API")
+    args = parser.parse_args()
+
+    envs.API_ROOT = args.root
+    build_snapshot(sys.stdin.read().strip() or None, args.file)
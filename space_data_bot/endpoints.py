@@ -0,0 +1,298 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable
+from urllib.parse import urlencode
+
+from space_data_bot import envs, content
+from space_data_bot.metrics import metrics
+
+
+# PAGINATION STYLES
+NO_PAGINATION = "none"
+PAGE_NUMBER = "page"  # {"count": .., "next": url, "previous": url, "results": []}
+
+# ID ARGUMENT (appended to the endpoint path)
+NO_ID = "none"
+OPTIONAL_ID = "optional"
+REQUIRED_ID = "required"
+
+TAGS_DESCRIPTION = "eg: tags=Agency or tags=Agency,Manufacturer"
+
+# filters accepting comma-separated values
+MULTI_VALUE_FILTERS = (envs.F_TAG,)
+
+
+def normalize(filter: str, value: str) -> str:
+    """Trims a filter value, and sorts and deduplicates the values of a
+    multi-value filter, so that equivalent searches send the same request.
+    eg: tags=" manufacturer,  Agency,agency" -> "Agency,manufacturer"
+    """
+    value = " ".join(str(value).split())
+
+    if filter in MULTI_VALUE_FILTERS:
+        values = {}
+        for elem in value.split(","):
+            elem = elem.strip()
+            if elem:
+                values.setdefault(elem.casefold(), elem)
+        value = ",".join(values[k] for k in sorted(values))
+
+    return value
+
+
+def canonical(query: dict) -> str:
+    """The canonical form of normalized filters, used in the cache keys.
+    recon.space filters are case insensitive, so values are case-folded.
+    """
+    return urlencode(sorted((k, v.casefold()) for k, v in query.items()),
+                     safe=",")
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """Declares a recon.space endpoint and the policies applied to it.
+
+    The Discord command, its arguments and the API call are generated from
+    these attributes, so tuning an endpoint is a one-line change here.
+
+    Attributes:
+        path (str): the API path, also used as the command name.
+        doc (str): the command description (100 characters max).
+        auth (bool): a JWT is required.
+        shared (bool): the response is the same for every connected user,
+            it is cached once for all of them. Only users whose token is
+            valid can read it.
+        filters (dict): command argument -> API filter (envs.F_*).
+        descriptions (dict): command argument -> help shown by Discord.
+        id (str): NO_ID, OPTIONAL_ID or REQUIRED_ID.
+        default (str): message sent when no argument is given, the API is
+            not called.
+        ttl (int): seconds a response stays cached, 0 disables caching.
+        negative_ttl (int): seconds an empty or not found result stays
+            cached, 0 disables it.
+        stale_ttl (int): seconds an expired response is still served while
+            it is revalidated in the background.
+        timeout (float): seconds before giving up on recon.space.
+        retries (int): new attempts after a network error.
+        max_bytes (int): a larger body is not loaded in memory, only its
+            first envs.STREAM_RECORDS records are decoded from the stream.
+        pagination (str): NO_PAGINATION or PAGE_NUMBER.
+        renderer (Callable): converts the JSON data into a Discord message.
+    """
+    path: str
+    doc: str
+    auth: bool = False
+    shared: bool = False
+    filters: dict = field(default_factory=dict)
+    descriptions: dict = field(default_factory=dict)
+    id: str = NO_ID
+    default: str = ""
+    ttl: int = envs.DEFAULT_CACHE_TTL
+    negative_ttl: int = envs.NEGATIVE_CACHE_TTL
+    stale_ttl: int = envs.STALE_TTL
+    timeout: float = envs.DEFAULT_TIMEOUT
+    retries: int = envs.DEFAULT_RETRIES
+    max_bytes: int = envs.MAX_BODY_BYTES
+    pagination: str = NO_PAGINATION
+    renderer: Callable = content.data_message
+
+    def arguments(self) -> list[str]:
+        """Command arguments, in the order Discord shows them."""
+        args = list(self.filters)
+        if self.id == REQUIRED_ID:
+            return ["id"] + args
+        if self.id == OPTIONAL_ID:
+            return args + ["id"]
+        return args
+
+    def query(self, args: dict) -> dict:
+        """Translates command arguments into normalized API filters,
+        dropping the empty ones."""
+        query = {}
+        for arg, value in args.items():
+            if arg in self.filters and value:
+                value = normalize(self.filters[arg], value)
+                if value:
+                    query[self.filters[arg]] = value
+        return query
+
+    def policy(self) -> dict:
+        return {
+            "auth": self.auth,
+            "shared": self.shared,
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "stale_ttl": self.stale_ttl,
+            "timeout": self.timeout,
+            "retries": self.retries,
+            "max_bytes": self.max_bytes,
+            "pagination": self.pagination,
+            "renderer": self.renderer.__name__,
+        }
+
+
+ENDPOINTS = {endpoint.path: endpoint for endpoint in [
+    # PUBLIC ENDPOINTS
+    Endpoint(
+        envs.ORGNAMEPUBLIC,
+        "Allows a user to get information about space organizations "
+        "(50% of DB content).",
+        filters={"orgname": envs.F_ORGNAME, "tags": envs.F_TAG},
+        descriptions={"orgname": "The name of the organization",
+                      "tags": TAGS_DESCRIPTION},
+        default=content.ORGNAME_DEFAULT,
+        ttl=300,
+        pagination=PAGE_NUMBER,
+        renderer=content.results_message,
+    ),
+    Endpoint(
+        envs.ORGNAMEGPSPUBLIC,
+        "Allows a user to get information about the localization of space "
+        "organizations (33% of DB content).",
+        filters={"orgname": envs.F_ORGNAME, "tags": envs.F_TAG},
+        descriptions={"orgname": "The name of the organization",
+                      "tags": TAGS_DESCRIPTION},
+        default=content.ORGNAMEGPS_DEFAULT,
+        ttl=300,
+        pagination=PAGE_NUMBER,
+        renderer=content.results_message,
+    ),
+    Endpoint(
+        envs.WEAPONSPUBLIC,
+        "Allows a user to get information about space-related weapons "
+        "(not all details).",
+        ttl=3600,
+    ),
+    Endpoint(
+        envs.RECORDS,
+        "Allows a user to get an insight into the database content.",
+        ttl=600,
+    ),
+    Endpoint(
+        envs.TAG,
+        "Allows a user to get all tags available for filtering purposes.",
+        ttl=3600,
+    ),
+
+    # CONNECTED ENDPOINTS
+    Endpoint(
+        envs.ACCOUNT,
+        "Once logged in, you can check your account details.",
+        auth=True,
+    ),
+    Endpoint(
+        envs.ORGNAME,
+        "Allows a user to get information about space organizations.",
+        auth=True,
+        shared=True,
+        ttl=envs.SHARED_CACHE_TTL,
+        filters={"orgname": envs.F_ORGNAME,
+                 "tags": envs.F_TAG,
+                 "satellite_named": envs.F_HASSATNAME,
+                 "satellite_operated_by_country": envs.F_HASSATCOUNTRY},
+        descriptions={"orgname": "The name of the organization",
+                      "tags": TAGS_DESCRIPTION,
+                      "satellite_named": "eg : Oneweb",
+                      "satellite_operated_by_country": "eg: Brazil"},
+        id=OPTIONAL_ID,
+        pagination=PAGE_NUMBER,
+    ),
+    Endpoint(
+        envs.ORGNAMEGPS,
+        "Allows a user to get information about space organizations.",
+        auth=True,
+        shared=True,
+        ttl=envs.SHARED_CACHE_TTL,
+        filters={"orgname": envs.F_ORGNAME, "tags": envs.F_TAG},
+        descriptions={"orgname": "The name of the organization",
+                      "tags": TAGS_DESCRIPTION},
+        pagination=PAGE_NUMBER,
+    ),
+    Endpoint(
+        envs.DOMAIN,
+        "Allows a user to get information about domains owned by a space "
+        "organization.",
+        auth=True,
+        id=OPTIONAL_ID,
+    ),
+    Endpoint(
+        envs.SUBDOMAIN,
+        "Allows a user to get information about sub-domains used by a space "
+        "organization.",
+        auth=True,
+        id=REQUIRED_ID,
+    ),
+    Endpoint(
+        envs.IP,
+        "Allows a user to get information about IP addresses used by a "
+        "space organization.",
+        auth=True,
+        id=REQUIRED_ID,
+    ),
+    Endpoint(
+        envs.SATELLITE,
+        "Allows a user to get information about satellites of a space "
+        "organization.",
+        auth=True,
+        shared=True,
+        ttl=envs.SHARED_CACHE_TTL,
+        filters={"name": envs.F_SATNAME,
+                 "country_operator": envs.F_SATCOUNTRY,
+                 "orbit": envs.F_SATORBIT,
+                 "launch_vehicle": envs.F_SATVEHICLE},
+        descriptions={"name": "eg: Tian",
+                      "country_operator": "eg: China",
+                      "orbit": "eg: GEO",
+                      "launch_vehicle": "eg: Falcon"},
+        pagination=PAGE_NUMBER,
+    ),
+    Endpoint(
+        envs.TAGLAWS,
+        "Allows a user to get information of laws and guidelines to which a "
+        "space organization is subject.",
+        auth=True,
+        shared=True,
+        ttl=envs.SHARED_CACHE_TTL,
+    ),
+    Endpoint(
+        envs.WEAPONS,
+        "Allows a user to get information about space-related weapons.",
+        auth=True,
+        shared=True,
+        ttl=envs.SHARED_CACHE_TTL,
+    ),
+    Endpoint(
+        envs.FINANCIAL,
+        "Allows a user to get information about finance of a space "
+        "organization.",
+        auth=True,
+        id=REQUIRED_ID,
+    ),
+]}
+
+
+for endpoint in ENDPOINTS.values():
+    metrics.info("endpoint_policy", endpoint.policy(), endpoint=endpoint.path)
@@ -39,6 +39,14 @@ HOME_URL = "https://recon.space"
 API_ROOT = "https://api.recon.space/myapi"
 TOKEN_FILE = Path(tempfile.gettempdir()) / "space_data_tokens.json"
 
+# CACHE ENV
+# Leave SPACEDATA_CACHE_URL empty to cache in memory, or share the cache,
+# the tokens and the locks of several bot processes with a Redis server:
+# redis://:<password>@<host>:<port>/<db>
+CACHE_URL = os.getenv("SPACEDATA_CACHE_URL", "")
+CACHE_PREFIX = "spacedata:"
+TOKEN_TTL = 7 * 24 * 3600  # seconds, a refresh token does not live longer
+
 # PUBLIC ENDPOINTS
 ORGNAMEPUBLIC = "orgnamepublic"
 ORGNAMEGPSPUBLIC = "orgnamegpspublic"  # filter
@@ -68,9 +76,86 @@ F_SATNAME = "satellitename"
 F_SATCOUNTRY = "satellitecountryoperator"
 F_SATORBIT = "satelliteorbit"
 F_SATVEHICLE = "satellitelaunchvehicle"
+F_HASSATNAME = "hassatellitenamed"
+F_HASSATCOUNTRY = "hassatelliteoperatedbycountry"
+F_PAGE = "page"
+
+# PERFORMANCE POLICIES
+# Defaults of the endpoints registry, see endpoints.py to tune an endpoint
+DEFAULT_CACHE_TTL = 0  # seconds, 0 disables the response cache
+NEGATIVE_CACHE_TTL = 60  # seconds, for empty and not found results
+REVALIDATE_TTL = 3600  # seconds an expired response is kept to revalidate it
+STALE_TTL = 300  # seconds an expired response is served while revalidated
+REFRESH_WORKERS = 4  # threads revalidating responses in the background
+MAX_BODY_BYTES = 2 * 2 ** 20  # larger bodies are streamed, see STREAM_*
+STREAM_RECORDS = 100  # records kept from a streamed body, enough to render
+STREAM_CHUNK = 64 * 1024  # bytes read at a time from a streamed body
+PLAN_DEFAULT_SELECTIVITY = 0.01  # estimate of a filter without statistics
+PLAN_MAX_RESULTS = 100  # records of a query answered locally
+SHARED_CACHE_TTL = 600  # seconds, for the responses shared between users
+TOKEN_SEEN_TTL = 300  # seconds a token accepted by recon.space is trusted
+DEFAULT_TIMEOUT = 10  # seconds
+DEFAULT_RETRIES = 1  # new attempts after a network error
+RETRY_BACKOFF = 0.5  # seconds, doubled after each attempt
+DECODED_CACHE_SIZE = 128  # decoded responses reused by their body hash
+MESSAGE_CACHE_SIZE = 512  # rendered messages reused by their command
+
+# CACHE WARMER
+# Public queries prefetched at startup and refreshed before they expire,
+# separated by spaces, eg: "tag orgnamepublic?orgname=NASA&tags=Agency"
+WARM_QUERIES = os.getenv(
+    "SPACEDATA_WARM_QUERIES",
+    "tag records weaponspublic orgnamepublic?tags=Agency "
+    "orgnamepublic?tags=Manufacturer")
+WARM_INTERVAL = 30  # seconds between two checks of the hot queries
+WARM_AHEAD = 60  # seconds before expiry when a hot query is refreshed
+
+# MIRROR
+# Public datasets held in memory to answer some commands locally
+MIRROR_ENABLED = os.getenv("SPACEDATA_MIRROR", "1") == "1"
+MIRROR_INTERVAL = 6 * 3600  # seconds between two synchronizations
+MIRROR_BUILD_TIMEOUT = 30 * 60  # seconds before a sync is given up
+MIRROR_MERGE_DELAY = 1  # seconds the records fetched by users are batched
+# Optional recon.space account used to mirror the connected datasets
+MIRROR_EMAIL = os.getenv("SPACEDATA_EMAIL")
+MIRROR_PASSWORD = os.getenv("SPACEDATA_PASSWORD")
+MIRROR_USER_ID = "mirror"
+# file the mirror is saved to and restored from at startup, "" to disable
+SNAPSHOT_PATH = os.getenv("SPACEDATA_SNAPSHOT", "spacedata.snapshot")
+
+# CHANGE WATCHER
+# Announces new and changed records in the CHANNEL_ID channel
+WATCH_ENABLED = os.getenv("SPACEDATA_WATCH", "1") == "1"
+WATCH_INTERVAL = 15 * 60  # seconds between two polls of the records counts
+WATCH_MAX_HASHES = 50_000  # record hashes kept per endpoint
+
+# WATCHDOG
+# Reports the commands blocking the Discord event loop
+LAG_INTERVAL = 0.5  # seconds between two measures of the event loop lag
+LAG_THRESHOLD = float(os.getenv("SPACEDATA_LAG_THRESHOLD", "0.25"))  # seconds
+# observes the peak memory of each command, at the cost of a slower bot
+TRACE_MEMORY = os.getenv("SPACEDATA_TRACE_MEMORY", "0") == "1"
+# seconds between two logs of the metrics (hit rates, latencies...), 0 to
+# disable
+METRICS_INTERVAL = float(os.getenv("SPACEDATA_METRICS_INTERVAL", "300"))
+
+# WORKERS
+# Rendering and bulk data processing run outside of the Discord event loop,
+# in a "thread" or "process" pool. Smaller payloads are processed inline.
+WORKERS_EXECUTOR = os.getenv("SPACEDATA_WORKERS_EXECUTOR", "thread")
+WORKERS_NUMBER = int(os.getenv("SPACEDATA_WORKERS_NUMBER", "2"))
+WORKERS_INLINE_SIZE = 16 * 1024  # bytes
+
+# CAPTURE
+# Records the commands and the recon.space traffic to a file, to replay them
+# with space_data_bot.replay, "" to disable
+CAPTURE_PATH = os.getenv("SPACEDATA_CAPTURE", "")
+CAPTURE_BODY_BYTES = 256 * 1024  # larger bodies are not recorded
 
 MAX_ITER_NUMBER = 5
+STATS_TOP = 15  # values listed by /stats
 MAX_MESSAGE_LENGTH = 1900
+TABLE_CELL_WIDTH = 24  # longer values are abbreviated in tables
 
 TOKEN_INIT_ERROR_ID = 0
 TOKEN_USER_ERROR_ID = 1
@@ -0,0 +1,250 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Offline copy of what a recon.space account can see, eg:
+python -m space_data_bot.export --out export/ --format jsonl
+
+Records are written page by page, and a checkpoint is saved after each one:
+an interrupted export started again with the same --out resumes where it
+stopped.
+"""
+
+import argparse
+import getpass
+import json
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from space_data_bot import envs
+from space_data_bot.api import SpaceDataApi
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # only needed by --format parquet
+    pyarrow = None
+
+
+logger = logging.getLogger(__name__)
+
+EXPORTED = (envs.ORGNAME, envs.ORGNAMEGPS, envs.SATELLITE, envs.WEAPONS,
+            envs.TAGLAWS)
+USER_ID = "export"
+
+
+class Checkpoint:
+    """The pages of an endpoint already written, saved in
+    <out>/<endpoint>.checkpoint.json."""
+
+    def __init__(self, out: str, path: str) -> None:
+        self._file = os.path.join(out, f"{path}.checkpoint.json")
+        self.pages = set()
+        self.count = None
+        self.offset = 0  # size of the JSONL file after the last page
+        self.done = False
+
+        if os.path.exists(self._file):
+            with open(self._file) as file:
+                data = json.load(file)
+            self.pages = set(data["pages"])
+            self.count = data["count"]
+            self.offset = data["offset"]
+            self.done = data["done"]
+
+    def save(self) -> None:
+        tmp = f"{self._file}.tmp"
+        with open(tmp, "w") as file:
+            json.dump({"pages": sorted(self.pages), "count": self.count,
+                       "offset": self.offset, "done": self.done}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self._file)  # atomic, never half written
+
+
+class JsonlWriter:
+    """Appends the records of an endpoint to <out>/<endpoint>.jsonl."""
+
+    def __init__(self, out: str, path: str, checkpoint: Checkpoint) -> None:
+        self._checkpoint = checkpoint
+        self._file = open(os.path.join(out, f"{path}.jsonl"), "ab")
+        # drops a page written after the last checkpoint
+        self._file.truncate(checkpoint.offset)
+        self._file.seek(checkpoint.offset)
+
+    def write(self, number: int, records: list[dict]) -> None:
+        for record in records:
+            self._file.write(json.dumps(record).encode() + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._checkpoint.offset = self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes each page of an endpoint to <out>/<endpoint>/<page>.parquet,
+    parquet files not being appendable."""
+
+    def __init__(self, out: str, path: str, checkpoint: Checkpoint) -> None:
+        self._dir = os.path.join(out, path)
+        os.makedirs(self._dir, exist_ok=True)
+
+    def write(self, number: int, records: list[dict]) -> None:
+        file = os.path.join(self._dir, f"{number:06d}.parquet")
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), file)
+
+    def close(self) -> None:
+        pass
+
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+class Exporter:
+    """Downloads every page of the endpoints with a bounded number of
+    concurrent requests."""
+
+    def __init__(self, api: SpaceDataApi, out: str, format: str = "jsonl",
+                 concurrency: int = 4) -> None:
+        self._api = api
+        self._out = out
+        self._writer = WRITERS[format]
+        self._concurrency = concurrency
+        os.makedirs(out, exist_ok=True)
+
+    def _page(self, path: str, number: int):
+        """Downloads a page, refreshing the token once if it expired."""
+        page, _ = self._api.with_token(
+            USER_ID, self._api.get_token(USER_ID),
+            lambda token: self._api.page(path, number, token))
+        return page
+
+    def export(self, path: str) -> int:
+        """Exports the missing pages of an endpoint.
+
+        Returns:
+            int: number of records written
+        """
+        checkpoint = Checkpoint(self._out, path)
+        if checkpoint.done:
+            logger.info("%s already exported", path)
+            return 0
+
+        first = self._page(path, 1)
+        if not isinstance(first, dict):  # not paginated, a single page
+            first = {"count": len(first), "results": first}
+
+        count = first.get("count", 0)
+        size = len(first.get("results", [])) or 1
+        last = -(-count // size) if first.get("next") else 1
+        if checkpoint.count not in (None, count):
+            logger.warning("%s changed from %s to %s records since the "
+                           "checkpoint, records may be missing or repeated",
+                           path, checkpoint.count, count)
+        checkpoint.count = count
+
+        todo = [number for number in range(1, last + 1)
+                if number not in checkpoint.pages]
+        writer = self._writer(self._out, path, checkpoint)
+        written = 0
+
+        try:
+            with ThreadPoolExecutor(self._concurrency,
+                                    thread_name_prefix="export") as pool:
+                running = {}
+                while todo or running:
+                    # a bounded window keeps the downloaded pages in memory
+                    while todo and len(running) < self._concurrency:
+                        number = todo.pop(0)
+                        if number == 1:
+                            running[pool.submit(lambda: first)] = number
+                        else:
+                            running[pool.submit(self._page, path,
+                                                number)] = number
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        number = running.pop(future)
+                        records = future.result().get("results", [])
+                        writer.write(number, records)
+                        checkpoint.pages.add(number)
+                        checkpoint.save()
+                        written += len(records)
+
+                    logger.info("%s: %s/%s pages", path,
+                                len(checkpoint.pages), last)
+        finally:
+            writer.close()
+
+        checkpoint.done = True
+        checkpoint.save()
+        return written
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.api:
+        envs.API_ROOT = args.api
+    api = SpaceDataApi()
+
+    password = args.password or getpass.getpass("recon.space password: ")
+    message = api.connect(args.email, password, id=USER_ID)
+    print(message)
+    if not api.get_token(USER_ID):
+        return
+
+    exporter = Exporter(api, args.out, args.format, args.concurrency)
+    for path in args.endpoints:
+        print(f"{path}: {exporter.export(path)} records written")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(
+        description="Exports the recon.space records an account can see.")
+    parser.add_argument("endpoints", nargs="*",
+                        help=f"endpoints to export, all by default: "
+                             f"{' '.join(EXPORTED)}")
+    parser.add_argument("--out", default="export", help="output directory")
+    parser.add_argument("--format", default="jsonl", choices=list(WRITERS))
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="pages downloaded at the same time")
+    parser.add_argument("--email", default=envs.MIRROR_EMAIL,
+                        required=not envs.MIRROR_EMAIL)
+    parser.add_argument("--password", default=envs.MIRROR_PASSWORD,
+                        help="asked if not given")
+    parser.add_argument("--api", help="root of the API, eg: a mock")
+    args = parser.parse_args()
+    args.endpoints = args.endpoints or list(EXPORTED)
+
+    unknown = set(args.endpoints) - set(EXPORTED)
+    if unknown:
+        parser.error(f"unknown endpoints: {' '.join(sorted(unknown))}")
+
+    if args.format == "parquet" and pyarrow is None:
+        parser.error("--format parquet requires pyarrow: pip install pyarrow")
+
+    main(args)
@@ -0,0 +1,317 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Load test of the Discord commands against a local mock of recon.space.
+
+The commands registered in client.tree are called directly with synthetic
+interactions, arriving at increasing rates, eg:
+python -m space_data_bot.loadtest --rates 5,10,20,40 \
+    --mix satellite=3,orgname=2,tag=1 --latency 0.3 --duration 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import time
+from contextlib import contextmanager
+
+from space_data_bot import envs
+from space_data_bot.endpoints import ENDPOINTS, REQUIRED_ID
+from space_data_bot.metrics import metrics
+from space_data_bot.mockapi import MockApiServer
+
+
+ACK_DEADLINE = 3  # seconds Discord waits for the first answer
+FOLLOWUP_DEADLINE = 15 * 60  # seconds a deferred interaction stays valid
+
+
+class FakeInteraction:
+    """The part of discord.Interaction used by the commands, recording
+    when they answer."""
+
+    class _User:
+        def __init__(self, id: int) -> None:
+            self.id = id
+
+    class _Response:
+        def __init__(self, interaction) -> None:
+            self._interaction = interaction
+            self._done = False
+
+        def is_done(self) -> bool:
+            return self._done
+
+        async def defer(self, **kwargs) -> None:
+            self._done = True
+            self._interaction.acked = time.perf_counter()
+
+        async def send_message(self, message: str, **kwargs) -> None:
+            self._done = True
+            self._interaction.acked = time.perf_counter()
+            self._interaction.answered = self._interaction.acked
+            self._interaction.message = message
+
+    class _Followup:
+        def __init__(self, interaction) -> None:
+            self._interaction = interaction
+
+        async def send(self, message: str, **kwargs) -> None:
+            self._interaction.answered = time.perf_counter()
+            self._interaction.message = message
+
+    def __init__(self, user_id: int) -> None:
+        self.user = self._User(user_id)
+        self.response = self._Response(self)
+        self.followup = self._Followup(self)
+        self.created = time.perf_counter()
+        self.acked = None
+        self.answered = None
+        self.message = None
+
+
+def parse_mix(text: str) -> dict:
+    """eg: "satellite=3,tag=1" -> {"satellite": 3, "tag": 1}"""
+    mix = {}
+    for elem in text.split(","):
+        name, _, weight = elem.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"unknown command: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def synthetic_args(path: str, distinct: int) -> dict:
+    """Arguments of a command, drawn among `distinct` values per argument
+    to control the cache hit rate."""
+    endpoint = ENDPOINTS[path]
+    args = {arg: f"q{random.randrange(distinct)}"
+            for arg in list(endpoint.filters)[:1]}
+
+    if endpoint.id == REQUIRED_ID:
+        args["id"] = str(random.randrange(distinct))
+
+    return args
+
+
+def memory() -> int:
+    """Resident memory of the process in bytes."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:  # peak only, outside Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+@contextmanager
+def mocked_bot(root: str, users, trace_memory: bool = False):
+    """Imports the bot against a mock of recon.space, with mock tokens for
+    its users, and watches the event loop meanwhile. Used by the load test
+    and by space_data_bot.replay.
+
+    Args:
+        root (str): the API root of the mock
+        users (Iterable): ids of the connected users
+        trace_memory (bool, optional): measure the peak memory of each
+            command.
+
+    Yields:
+        module: space_data_bot.main
+    """
+    envs.API_ROOT = root
+    envs.CAPTURE_PATH = ""  # the mock traffic is not captured
+    envs.TRACE_MEMORY = trace_memory
+    envs.GUILD_ID = envs.GUILD_ID or 0
+
+    # imported once the API is mocked, it creates the client
+    from space_data_bot import main as bot
+    from space_data_bot.watchdog import LoopWatchdog
+
+    for user in users:
+        bot.space_data.set_token(user, {"access": "mock-access",
+                                        "refresh": "mock-refresh"})
+
+    watchdog = LoopWatchdog()
+    watchdog.start()
+    try:
+        yield bot
+    finally:
+        watchdog.stop()
+
+
+async def run_step(tree, mix: dict, rate: float, duration: float,
+                   distinct: int, users: int) -> dict:
+    """Sends commands at `rate` per second during `duration` seconds, with
+    Poisson arrivals, and waits for all of them.
+
+    The rate actually offered and the throughput are both measured over the
+    arrival window, the throughput once shifted by the fastest answer: the
+    time left to answer the last commands is not counted.
+    """
+    names, weights = list(mix), list(mix.values())
+    interactions, tasks = [], []
+    in_flight = peak_in_flight = 0
+
+    async def invoke(name: str) -> None:
+        nonlocal in_flight, peak_in_flight
+        interaction = FakeInteraction(random.randrange(users))
+        interactions.append(interaction)
+        command = tree.get_command(name)
+
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        try:
+            await command.callback(interaction,
+                                   **synthetic_args(name, distinct))
+        finally:
+            in_flight -= 1
+
+    metrics.reset()
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        name = random.choices(names, weights)[0]
+        tasks.append(asyncio.create_task(invoke(name)))
+        await asyncio.sleep(random.expovariate(rate))
+    window = time.perf_counter() - start
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    acks = [i.acked - i.created for i in interactions if i.acked]
+    answers = [i.answered - i.created for i in interactions if i.answered]
+    shift = start + min(answers, default=0)
+    return {
+        "rate": rate,
+        "sent": len(interactions),
+        "offered": len(interactions) / window,
+        "throughput": sum(1 for i in interactions if i.answered
+                          and i.answered <= shift + window) / window,
+        "peak_in_flight": peak_in_flight,
+        "ack_p50": percentile(acks, 50),
+        "ack_p99": percentile(acks, 99),
+        "answer_p50": percentile(answers, 50),
+        "answer_p99": percentile(answers, 99),
+        "missed_ack": sum(1 for i in interactions
+                          if not i.acked or i.acked - i.created
+                          > ACK_DEADLINE),
+        "missed_answer": sum(1 for i in interactions
+                             if not i.answered or i.answered - i.created
+                             > FOLLOWUP_DEADLINE),
+        "loop_lag_p99": metrics.percentile("loop_lag_seconds", 99),
+        "memory": memory(),
+        # 0 unless the memory is traced, see envs.TRACE_MEMORY
+        "command_peak_p99": max(
+            metrics.percentile("command_peak_bytes", 99, command=name)
+            for name in names),
+    }
+
+
+def chart(results: list[dict]) -> str:
+    """A text table of the steps, with a bar of the 99th percentile answer
+    latency."""
+    worst = max(r["answer_p99"] for r in results) or 1
+    lines = [
+        f"{'rate/s':>7} {'sent':>6} {'sent/s':>7} {'done/s':>7} "
+        f"{'inflight':>8} "
+        f"{'ack p99':>8} {'p50':>7} {'p99':>7} {'missed':>6} "
+        f"{'lag p99':>8} {'RSS MB':>7} {'peak KB':>8}  answer p99"
+    ]
+    for r in results:
+        bar = "#" * int(30 * r["answer_p99"] / worst)
+        lines.append(
+            f"{r['rate']:>7.1f} {r['sent']:>6} {r['offered']:>7.1f} "
+            f"{r['throughput']:>7.1f} "
+            f"{r['peak_in_flight']:>8} {r['ack_p99']:>8.3f} "
+            f"{r['answer_p50']:>7.3f} {r['answer_p99']:>7.3f} "
+            f"{r['missed_ack'] + r['missed_answer']:>6} "
+            f"{r['loop_lag_p99']:>8.3f} {r['memory'] / 2**20:>7.1f} "
+            f"{r['command_peak_p99'] / 2**10:>8.1f}  {bar}")
+    return "\n".join(lines)
+
+
+def saturation(results: list[dict]) -> dict:
+    """The first step missing Discord deadlines or answering less than 90%
+    of the rate actually offered, None if the bot kept up."""
+    for r in results:
+        if r["missed_ack"] or r["missed_answer"] \
+                or r["throughput"] < 0.9 * r["offered"]:
+            return r
+
+
+async def main(args: argparse.Namespace) -> list[dict]:
+    with MockApiServer(latency=args.latency, jitter=args.jitter,
+                       records=args.records) as server, \
+            mocked_bot(server.root, range(args.users),
+                       args.trace_memory) as bot:
+        results = []
+        mix = parse_mix(args.mix)
+        for rate in (float(r) for r in args.rates.split(",")):
+            result = await run_step(bot.client.tree, mix, rate,
+                                    args.duration, args.distinct,
+                                    args.users)
+            results.append(result)
+            print(chart(results[-1:]).splitlines()[-1], flush=True)
+
+    print()
+    print(chart(results))
+    saturated = saturation(results)
+    if saturated:
+        print(f"\nSaturated at {saturated['offered']:.1f} commands/s "
+              f"(step {saturated['rate']})")
+    else:
+        print("\nNo saturation, try higher rates")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load test of the bot commands against a mock API.")
+    parser.add_argument("--rates", default="5,10,20,40",
+                        help="commands per second of each step")
+    parser.add_argument("--duration", type=float, default=15,
+                        help="seconds per step")
+    parser.add_argument("--mix", default="satellite=3,orgname=2,tag=1",
+                        help="weight of each command")
+    parser.add_argument("--latency", type=float, default=0.3,
+                        help="seconds added to each mock API answer")
+    parser.add_argument("--jitter", type=float, default=0.1,
+                        help="random seconds added to the latency")
+    parser.add_argument("--records", type=int, default=20,
+                        help="records of each mock API endpoint")
+    parser.add_argument("--distinct", type=int, default=50,
+                        help="distinct values of each command argument")
+    parser.add_argument("--users", type=int, default=100,
+                        help="number of connected users")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="measure the peak memory of each command")
+    asyncio.run(main(parser.parse_args()))
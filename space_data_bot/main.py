@@ -22,14 +22,39 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import asyncio
+import inspect
+import logging
+
 import discord
 from discord import app_commands
 
-from space_data_bot import envs, content
+from space_data_bot import envs, content, messages, planner, workers, \
+    watchdog
 from space_data_bot.api import SpaceDataApi
+from space_data_bot.dataset import Mirror
+from space_data_bot.endpoints import ENDPOINTS, REQUIRED_ID, Endpoint
+from space_data_bot.messages import DEFAULT_MODE, MODES, TABLE_MODE
+from space_data_bot.metrics import metrics
+from space_data_bot.tagindex import positions
+from space_data_bot.warmer import CacheWarmer
+from space_data_bot.watcher import ChangeWatcher
 
 
 GUILD_ID = discord.Object(id=envs.GUILD_ID)
+logger = logging.getLogger(__name__)
+
+
+class CommandTree(app_commands.CommandTree):
+    """Records the commands in the capture of the API, if there is one."""
+
+    async def interaction_check(self, interaction: discord.Interaction
+                                ) -> bool:
+        if space_data.capture is not None and interaction.command:
+            space_data.capture.command(interaction.command.name,
+                                       interaction.user.id,
+                                       dict(interaction.namespace))
+        return True
 
 
 class SpaceDataClient(discord.Client):
@@ -45,17 +70,56 @@ class SpaceDataClient(discord.Client):
     """
     def __init__(self, *, intents: discord.Intents):
         super().__init__(intents=intents)
-        self.tree = app_commands.CommandTree(self)
+        self.tree = CommandTree(self)
+        self.warmer = CacheWarmer(space_data)
+        self.watchdog = watchdog.LoopWatchdog()
+        self.mirror = Mirror(space_data)
+        self.watcher = ChangeWatcher(space_data, self.announce,
+                                     token_id=envs.MIRROR_USER_ID)
+        self.metrics_task = None
+
+    async def announce(self, message: str) -> None:
+        channel = self.get_channel(int(envs.CHANNEL_ID))
+        if channel is not None:
+            await channel.send(message)
+
+    async def log_metrics(self) -> None:
+        """Logs every metric periodically: the hit rates of the caches, the
+        latencies, the loop stalls and the memory of the commands."""
+        while True:
+            await asyncio.sleep(envs.METRICS_INTERVAL)
+            logger.info("metrics:\n%s", metrics.summary())
 
     async def setup_hook(self):
         # This copies the global commands over to the guild.
         self.tree.copy_global_to(guild=GUILD_ID)
         await self.tree.sync(guild=GUILD_ID)
+        self.watchdog.start()
+        self.warmer.start()
+        if envs.MIRROR_ENABLED:
+            self.mirror.start()
+        if envs.WATCH_ENABLED and envs.CHANNEL_ID:
+            self.watcher.start()
+        if envs.METRICS_INTERVAL:
+            self.metrics_task = asyncio.create_task(self.log_metrics(),
+                                                    name="metrics")
+
+    async def close(self):
+        if self.metrics_task is not None:
+            self.metrics_task.cancel()
+        self.warmer.stop()
+        self.mirror.stop()
+        self.watcher.stop()
+        self.watchdog.stop()
+        await super().close()
+        workers.shutdown()
+        if space_data.capture is not None:
+            space_data.capture.close()
 
 
+space_data = SpaceDataApi()
 intents = discord.Intents.default()
 client = SpaceDataClient(intents=intents)
-space_data = SpaceDataApi()
 
 
 @client.event
@@ -63,11 +127,19 @@ async def on_ready():
     print(f"Logged in as {client.user} (ID: {client.user.id})")
 
 
+# built from the endpoints registry, once
+HELP = content.help_message(
+    {**{endpoint.path: endpoint.doc for endpoint in ENDPOINTS.values()
+        if not endpoint.auth}, **content.HELP_COMMANDS},
+    {endpoint.path: endpoint.doc for endpoint in ENDPOINTS.values()
+     if endpoint.auth})
+
+
 @client.tree.command()
 async def help(interaction: discord.Interaction) -> None:
     """All the commands you can use with SpaceData Bot."""
-    await interaction.response.send_message(content.help_message(),
-                                            ephemeral=True)
+    with watchdog.track("help"):
+        await interaction.response.send_message(HELP, ephemeral=True)
 
 
 """
@@ -82,249 +154,227 @@ async def connect(interaction: discord.Interaction,
     """Allows a user to connect to their account;
     an access token and a refresh token are provided."""
 
-    await interaction.response.defer(ephemeral=True)
-    message = space_data.connect(email, password, id=interaction.user.id)
-    await interaction.followup.send(message, ephemeral=True)
+    with watchdog.track("connect"):
+        await interaction.response.defer(ephemeral=True)
+        message = await asyncio.to_thread(space_data.connect, email,
+                                          password, id=interaction.user.id)
+        await interaction.followup.send(message, ephemeral=True)
 
 
 @client.tree.command()
-@app_commands.describe(orgname="The name of the organization",
-                       tags="eg: tags=Agency or tags=Agency,Manufacturer")
-async def orgnamepublic(
-    interaction: discord.Interaction, orgname: str = "", tags: str = ""
-) -> None:
-    """Allows a user to get information about space organizations
-    (50% of DB content)."""
-    await interaction.response.defer(ephemeral=True)
-    message = space_data.orgnamepublic(orgname, tags)
-    await interaction.followup.send(message, ephemeral=True)
+@app_commands.describe(expression="eg: Agency AND NOT (Misc OR Manufacturer)",
+                       gps="search the localization of the organizations")
+async def tagsearch(interaction: discord.Interaction, expression: str,
+                    gps: bool = False) -> None:
+    """Allows a user to search space organizations with a tag expression."""
+    with watchdog.track("tagsearch"):
+        path = envs.ORGNAMEGPSPUBLIC if gps else envs.ORGNAMEPUBLIC
+
+        with client.mirror.versions.read() as dataset:
+            if dataset is None:
+                message = content.MIRROR_LOADING
+            else:
+                try:
+                    bitmap = dataset.select_tags(path, expression)
+                    found = positions(bitmap, limit=100)
+                    message = content.tag_search_message(
+                        bitmap.bit_count(),
+                        dataset.stores[path].to_dicts(found))
+                except ValueError as error:
+                    message = content.TAG_SEARCH_ERROR.format(error=error)
+
+        await interaction.response.send_message(message, ephemeral=True)
+
+
+# /stats choices: name -> (endpoint, key, description)
+STATS = {
+    "orbit": (envs.SATELLITE, envs.F_SATORBIT, "satellites per orbit"),
+    "country": (envs.SATELLITE, envs.F_SATCOUNTRY,
+                "satellites per operating country"),
+    "vehicle": (envs.SATELLITE, envs.F_SATVEHICLE,
+                "satellites per launch vehicle"),
+    "tag": (envs.ORGNAMEPUBLIC, "tags", "organizations per tag"),
+    "orgtype": (envs.ORGNAMEPUBLIC, "orgtype", "organizations per type"),
+}
 
 
 @client.tree.command()
-@app_commands.describe(orgname="The name of the organization",
-                       tags="eg: tags=Agency or tags=Agency,Manufacturer")
-async def orgnamegpspublic(
-    interaction: discord.Interaction, orgname: str = "", tags: str = ""
-) -> None:
-    """Allows a user to get information about the localization of space
-    organizations (33% of DB content)."""
-    await interaction.response.defer(ephemeral=True)
-    message = space_data.orgnamegpspublic(orgname, tags)
-    await interaction.followup.send(message, ephemeral=True)
-
-
-@client.tree.command()
-async def weaponspublic(interaction: discord.Interaction) -> None:
-    """Allows a user to get information about space-related weapons
-    (not all details)."""
-    await interaction.response.defer(ephemeral=True)
-    message = space_data.weaponspublic()
-    await interaction.followup.send(message, ephemeral=True)
-
-
-@client.tree.command()
-async def records(interaction: discord.Interaction) -> None:
-    """Allows a user to get an insight into the database content."""
-    await interaction.response.defer(ephemeral=True)
-    message = space_data.records()
-    await interaction.followup.send(message, ephemeral=True)
-
-
-@client.tree.command()
-async def tag(interaction: discord.Interaction) -> None:
-    """Allows a user to get all tags available for filtering purposes."""
-    await interaction.response.defer(ephemeral=True)
-    message = space_data.tag()
-    await interaction.followup.send(message, ephemeral=True)
+@app_commands.describe(by="what to count",
+                       value="eg: GEO, to get a single count")
+@app_commands.choices(by=[app_commands.Choice(name=doc, value=name)
+                          for name, (_, _, doc) in STATS.items()])
+async def stats(interaction: discord.Interaction, by: str,
+                value: str = "") -> None:
+    """Allows a user to count satellites or organizations per value."""
+    with watchdog.track("stats"):
+        path, key, name = STATS[by]
+        send = interaction.response.send_message
+
+        if ENDPOINTS[path].auth:  # for connected users only, like the API
+            token = await asyncio.to_thread(space_data.get_token,
+                                            interaction.user.id)
+            if not await asyncio.to_thread(space_data.trusted, token):
+                await interaction.response.defer(ephemeral=True)
+                send = interaction.followup.send
+                if not await asyncio.to_thread(space_data.verify, token):
+                    await send(content.LOG_ERROR, ephemeral=True)
+                    return
+
+        with client.mirror.versions.read() as dataset:
+            if dataset is None:
+                message = content.MIRROR_LOADING
+            else:
+                aggregates = dataset.stats[path]
+                if value:
+                    counts = [(value, aggregates.count(key, value))]
+                else:
+                    counts = aggregates.top(key, envs.STATS_TOP)
+                message = content.stats_message(name, aggregates.total,
+                                                counts)
+
+        await send(message, ephemeral=True)
 
 
 """
-Endpoints accessible for connected users.
+Endpoints commands, generated from the endpoints registry.
 """
 
-
-@client.tree.command()
-async def myaccount(interaction: discord.Interaction) -> None:
-    """Once logged in, you can check your account details."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.myaccount(token)
-
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.myaccount(token)
-
-    await interaction.followup.send(message, ephemeral=True)
+VIEW_CHOICES = [app_commands.Choice(name=doc, value=mode)
+                for mode, doc in MODES.items()]
+VIEW_DESCRIPTIONS = {
+    "view": "how to display the results, see /view",
+    "columns": "table columns, eg: organisationname,tags",
+}
 
 
 @client.tree.command()
-@app_commands.describe(orgname="The name of the organization",
-                       tags="eg: tags=Agency or tags=Agency,Manufacturer",
-                       satellite_named="eg : Oneweb",
-                       satellite_operated_by_country="eg: Brazil"
-                       )
-async def orgname(interaction: discord.Interaction, orgname: str = "",
-                  tags: str = "", satellite_named: str = "",
-                  satellite_operated_by_country: str = "",
-                  id: str = "") -> None:
-    """Allows a user to get information about space organizations."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.orgname(
-        id,
-        token,
-        orgname=orgname,
-        tags=tags,
-        has_satellite_named=satellite_named,
-        has_satellite_operated_by_country=satellite_operated_by_country)
-
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.orgname(
-            id,
-            token,
-            orgname=orgname,
-            tags=tags,
-            has_satellite_named=satellite_named,
-            has_satellite_operated_by_country=satellite_operated_by_country)
-
-    await interaction.followup.send(message, ephemeral=True)
-
-
-@client.tree.command()
-@app_commands.describe(orgname="The name of the organization",
-                       tags="eg: tags=Agency or tags=Agency,Manufacturer")
-async def orgnamegps(interaction: discord.Interaction, orgname: str = "",
-                     tags: str = "") -> None:
-    """Allows a user to get information about space organizations."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.orgnamegps(token, orgname=orgname, tags=tags)
-
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.orgnamegps(token, orgname=orgname, tags=tags)
-
-    await interaction.followup.send(message, ephemeral=True)
-
+@app_commands.describe(**VIEW_DESCRIPTIONS)
+@app_commands.choices(view=VIEW_CHOICES)
+async def view(interaction: discord.Interaction, view: str,
+               columns: str = "") -> None:
+    """Allows a user to choose how results are displayed."""
+    with watchdog.track("view"):
+        if view != TABLE_MODE:  # only a table has columns
+            columns = ""
+        await asyncio.to_thread(space_data.set_view, interaction.user.id,
+                                view, columns)
+        await interaction.response.send_message(
+            content.VIEW_SET.format(view=MODES[view]), ephemeral=True)
+
+
+async def render(renderer, data, size: int, digest: str, key: tuple) -> str:
+    """Converts the data into a Discord message in the workers pool, or
+    directly if there is nothing to render. The message is reused while the
+    response of the command does not change."""
+    if isinstance(data, str):
+        return data
+
+    message = space_data.messages.get(key, digest)
+    if message is None:
+        with metrics.timer("render_seconds", endpoint=key[0]):
+            message = await workers.run(renderer, data, size=size)
+            message = content.cropped_notice(message, data)
+        space_data.messages.put(key, digest, message)
+
+    return message
+
+
+def lookup(user_id: int, endpoint: Endpoint, view: str, columns: str,
+           args: dict) -> tuple:
+    """Reads what a command needs before deciding to defer it: the token and
+    the view of the user, and the data if it can be answered without
+    calling recon.space.
+
+    Returns:
+        tuple: (token, view, columns, data as returned by peek() or None)
+    """
+    token = None
+    if endpoint.auth:
+        token = space_data.get_token(user_id)
 
-@client.tree.command()
-async def domain(interaction: discord.Interaction, id: str = "") -> None:
-    """Allows a user to get information about domains owned by a space
-    organization."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.domain(token, id)
+    if not view and not columns:
+        view, columns = space_data.get_view(user_id)
 
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.domain(token, id)
+    cached = space_data.peek(endpoint.path, token, **args)
+    if cached is None:  # from the mirror or another cached response
+        cached = planner.answer(space_data, client.mirror.versions, endpoint,
+                                token, args)
+    return token, view, columns, cached
 
-    await interaction.followup.send(message, ephemeral=True)
 
+async def dispatch(interaction: discord.Interaction, endpoint: Endpoint,
+                   view: str = "", columns: str = "", **args) -> None:
+    """Answers a command of the registry. A cached answer is sent at once,
+    otherwise the interaction is deferred while recon.space is called. The
+    token of a connected user is refreshed once if recon.space rejects it.
 
-@client.tree.command()
-async def subdomain(interaction: discord.Interaction, id: str) -> None:
-    """Allows a user to get information about sub-domains used by a space
-    organization."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.subdomain(token, id)
-
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.subdomain(token, id)
+    The data is rendered in the view asked by the command, or else in the one
+    chosen by the user with /view.
+    """
+    # the cache may be a Redis server: a blocking call, off the event loop
+    token, view, columns, cached = await asyncio.to_thread(
+        lookup, interaction.user.id, endpoint, view, columns, args)
 
-    await interaction.followup.send(message, ephemeral=True)
+    # columns alone imply a table, a view chosen explicitly wins
+    mode = view or (TABLE_MODE if columns else DEFAULT_MODE)
+    renderer = messages.renderer(endpoint, mode, columns)
+    key = messages.message_key(endpoint, mode=mode, columns=columns, **args)
 
+    if cached is not None:  # one Discord call instead of two
+        metrics.incr("dispatch_fast_path", endpoint=endpoint.path)
+        message = await render(renderer, *cached, key)
+        await interaction.response.send_message(message, ephemeral=True)
+        return
 
-@client.tree.command()
-async def ip(interaction: discord.Interaction, id: str) -> None:
-    """Allows a user to get information about IP addresses used by a space
-    organization."""
     await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.ip(token, id)
 
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.ip(token, id)
+    # requests are blocking, they must not hold the event loop
+    (data, size, digest), _ = await asyncio.to_thread(
+        space_data.with_token, interaction.user.id, token,
+        lambda token: space_data.load(endpoint.path, token, peeked=True,
+                                      **args),
+        rejected=lambda loaded: endpoint.auth
+        and loaded[0] == content.LOG_ERROR)
 
+    message = await render(renderer, data, size, digest, key)
     await interaction.followup.send(message, ephemeral=True)
 
 
-@client.tree.command()
-@app_commands.describe(name="eg: Tian",
-                       country_operator="eg: China",
-                       orbit="eg: GEO",
-                       launch_vehicle="eg: Falcon"
-                       )
-async def satellite(interaction: discord.Interaction, name: str = "",
-                    country_operator: str = "", orbit: str = "",
-                    launch_vehicle: str = "") -> None:
-    """Allows a user to get information about satellites of a space
-    organization."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.satellite(token,
-                                   name=name,
-                                   country_operator=country_operator,
-                                   orbit=orbit,
-                                   launch_vehicle=launch_vehicle)
-
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.satellite(token,
-                                       name=name,
-                                       country_operator=country_operator,
-                                       orbit=orbit,
-                                       launch_vehicle=launch_vehicle)
-
-    await interaction.followup.send(message, ephemeral=True)
-
-
-@client.tree.command()
-async def taglaws(interaction: discord.Interaction) -> None:
-    """Allows a user to get information of laws and guidelines to which a
-    space organization is subject."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.taglaws(token)
-
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.taglaws(token)
-
-    await interaction.followup.send(message, ephemeral=True)
+def endpoint_command(endpoint: Endpoint) -> app_commands.Command:
+    """Creates the Discord command of an endpoint. Its arguments are strings,
+    all optional except a required id."""
+    async def callback(interaction: discord.Interaction, **args) -> None:
+        with watchdog.track(endpoint.path):
+            await dispatch(interaction, endpoint, **args)
 
+    parameters = [inspect.Parameter(
+        "interaction", inspect.Parameter.POSITIONAL_OR_KEYWORD,
+        annotation=discord.Interaction)]
 
-@client.tree.command()
-async def weapons(interaction: discord.Interaction) -> None:
-    """Allows a user to get information about space-related weapons."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.weapons(token)
+    for arg in endpoint.arguments():
+        default = inspect.Parameter.empty
+        if arg != "id" or endpoint.id != REQUIRED_ID:
+            default = ""
 
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.weapons(token)
+        parameters.append(inspect.Parameter(
+            arg, inspect.Parameter.KEYWORD_ONLY, annotation=str,
+            default=default))
 
-    await interaction.followup.send(message, ephemeral=True)
+    for arg in ("view", "columns"):
+        parameters.append(inspect.Parameter(
+            arg, inspect.Parameter.KEYWORD_ONLY, annotation=str, default=""))
 
+    callback.__signature__ = inspect.Signature(parameters)
+    callback = app_commands.describe(**endpoint.descriptions,
+                                     **VIEW_DESCRIPTIONS)(callback)
+    callback = app_commands.choices(view=VIEW_CHOICES)(callback)
 
-@client.tree.command()
-async def financial(interaction: discord.Interaction, id: str) -> None:
-    """Allows a user to get information about finance of a space
-    organization."""
-    await interaction.response.defer(ephemeral=True)
-    token = space_data.get_token(interaction.user.id)
-    message = space_data.financial(token, id)
+    return app_commands.Command(name=endpoint.path, description=endpoint.doc,
+                                callback=callback)
 
-    if message == content.LOG_ERROR:
-        token = space_data.update_token(interaction.user.id)
-        message = space_data.financial(token, id)
 
-    await interaction.followup.send(message, ephemeral=True)
+for endpoint in ENDPOINTS.values():
+    client.tree.add_command(endpoint_command(endpoint))
 
 
 if __name__ == "__main__":
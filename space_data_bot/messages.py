@@ -0,0 +1,97 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import functools
+import threading
+from collections import OrderedDict
+
+from space_data_bot import envs, content
+from space_data_bot.endpoints import Endpoint, canonical
+from space_data_bot.metrics import metrics
+
+
+# render modes: the renderer of the endpoint, or content.table_message
+DEFAULT_MODE = "default"
+TABLE_MODE = "table"
+MODES = {DEFAULT_MODE: "detailed records", TABLE_MODE: "a compact table"}
+
+
+def parse_columns(text: str) -> tuple:
+    """Parses the columns of a table, eg: "organisationname, tags"."""
+    return tuple(column.strip().lower() for column in text.split(",")
+                 if column.strip())
+
+
+def renderer(endpoint: Endpoint, mode: str = DEFAULT_MODE,
+             columns: str = ""):
+    """The function converting the data of an endpoint into a message, in a
+    render mode. It can be run in a process pool."""
+    if mode == TABLE_MODE:
+        return functools.partial(content.table_message,
+                                 columns=parse_columns(columns))
+    return endpoint.renderer
+
+
+def message_key(endpoint: Endpoint, id: str = "", mode: str = DEFAULT_MODE,
+                columns: str = "", **args) -> tuple:
+    """Identifies the message of a command: equivalent arguments, eg: tags in
+    another order, give the same key."""
+    if mode == TABLE_MODE:
+        mode = f"{mode}:{','.join(parse_columns(columns))}"
+    return endpoint.path, str(id).strip(), canonical(endpoint.query(args)), \
+        mode
+
+
+class MessageCache:
+    """Rendered Discord messages of the last commands, the tier above the
+    decoded data: a repeated command is answered without encoding anything.
+
+    A message is stored with the digest of the response it was rendered
+    from, and is only reused for that same response.
+    """
+
+    def __init__(self, size: int = envs.MESSAGE_CACHE_SIZE) -> None:
+        self._size = size
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, digest: str) -> str:
+        """Returns: str: the message, None if not rendered from this
+        response"""
+        with self._lock:
+            cached = self._messages.get(key)
+            if cached is not None and cached[0] == digest:
+                self._messages.move_to_end(key)
+                metrics.incr("message_cache_hit", endpoint=key[0])
+                return cached[1]
+
+        metrics.incr("message_cache_miss", endpoint=key[0])
+        return None
+
+    def put(self, key: tuple, digest: str, message: str) -> None:
+        with self._lock:
+            self._messages[key] = (digest, message)
+            self._messages.move_to_end(key)
+            if len(self._messages) > self._size:
+                self._messages.popitem(last=False)
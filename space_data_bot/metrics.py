@@ -0,0 +1,137 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Metrics:
+    """In-process counters, gauges and timings shared by the whole bot.
+
+    Every value is stored under a name and a set of labels, eg:
+    metrics.incr("cache_hit", endpoint="tag")
+    Timings keep the last SAMPLES observations to compute percentiles.
+    """
+    SAMPLES = 1024
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = defaultdict(lambda: deque(maxlen=self.SAMPLES))
+        self._info = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> str:
+        if not labels:
+            return name
+
+        labels = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{labels}}}"
+
+    def incr(self, name: str, value: int = 1, **labels) -> None:
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._timings[self._key(name, labels)].append(value)
+
+    def info(self, name: str, data: dict, **labels) -> None:
+        """Publishes static information, like the policy of an endpoint."""
+        with self._lock:
+            self._info[self._key(name, labels)] = dict(data)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the time spent in the `with` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) -> int:
+        return self._counters.get(self._key(name, labels), 0)
+
+    @staticmethod
+    def _rank(values, q: float) -> float:
+        samples = sorted(values)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def percentile(self, name: str, q: float, **labels) -> float:
+        """Returns the q-th percentile (0-100) of a timing, 0 if unknown."""
+        with self._lock:
+            samples = list(self._timings.get(self._key(name, labels), ()))
+        return self._rank(samples, q)
+
+    def snapshot(self) -> dict:
+        """Returns a copy of every metric, timings summarized."""
+        with self._lock:
+            timings = {
+                key: {
+                    "count": len(values),
+                    "mean": sum(values) / len(values),
+                    "p50": self._rank(values, 50),
+                    "p99": self._rank(values, 99),
+                    "max": max(values),
+                }
+                for key, values in self._timings.items() if values
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings,
+                "info": dict(self._info),
+            }
+
+    def summary(self) -> str:
+        """Every counter, gauge and timing on one line each, sorted by
+        name, eg: for the logs."""
+        data = self.snapshot()
+        lines = [f"{key} = {value}"
+                 for key, value in data["counters"].items()]
+        lines += [f"{key} = {value:.4g}"
+                  for key, value in data["gauges"].items()]
+        lines += [f"{key}: count {t['count']}, p50 {t['p50']:.4g}, "
+                  f"p99 {t['p99']:.4g}, max {t['max']:.4g}"
+                  for key, t in data["timings"].items()]
+        return "\n".join(sorted(lines))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,194 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from space_data_bot import envs
+from space_data_bot.endpoints import ENDPOINTS
+
+
+def synthetic_records(path: str, number: int) -> list[dict]:
+    """Fake records shaped like the ones of an endpoint."""
+    tags = ["Agency", "Manufacturer", "Misc", "Launcher", "Operator"]
+    countries = ["France", "USA", "China", "Brazil", "India", "Japan"]
+
+    if path in (envs.SATELLITE,):
+        return [{
+            "id": i,
+            "satellitename": f"SAT-{i}",
+            "satellitecountryoperator": countries[i % len(countries)],
+            "satelliteorbit": ("LEO", "MEO", "GEO")[i % 3],
+            "satellitelaunchvehicle": ("Falcon 9", "Ariane 5", "Soyuz")[i % 3],
+        } for i in range(number)]
+
+    if path in (envs.WEAPONSPUBLIC, envs.WEAPONS):
+        return [{
+            "name": f"Weapon {i}",
+            "description": "Synthetic weapon " * 4,
+            "source": "https://example.org",
+            "vectortype": ("ASAT kinetic", "Laser", "Jamming")[i % 3],
+        } for i in range(number)]
+
+    if path in (envs.ORGNAMEGPSPUBLIC, envs.ORGNAMEGPS):
+        return [{
+            "id": i,
+            "organisationname": f"Organisation {i}",
+            "tags": [tags[i % len(tags)], tags[(i * 7) % len(tags)]],
+            "gps": f"POINT({i % 180}.5 {i % 90}.25)",
+        } for i in range(number)]
+
+    return [{
+        "id": i,
+        "organisationname": f"Organisation {i}",
+        "orgtype": ("For Profit", "Government")[i % 2],
+        "description": "Synthetic organisation " * 4,
+        "tags": [tags[i % len(tags)], tags[(i * 7) % len(tags)]],
+    } for i in range(number)]
+
+
+class MockApiServer(ThreadingHTTPServer):
+    """Local stand-in for api.recon.space with an injected latency, to load
+    test the bot without calling the real API.
+
+    eg: with MockApiServer(latency=0.2) as server:
+            envs.API_ROOT = server.root
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 records: int = 20, page_size: int = 20,
+                 host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        Args:
+            latency (float, optional): seconds added to every answer.
+            jitter (float, optional): random seconds added to the latency.
+            records (int, optional): records of each endpoint.
+            page_size (int, optional): records per page.
+        """
+        super().__init__((host, port), _MockApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.records = records
+        self.page_size = page_size
+        self.data = {}  # endpoint -> records, editable by tests
+        # access tokens accepted by the connected endpoints, each login
+        # issuing a new one
+        self.tokens = {"mock-access"}
+        self._issued = itertools.count(1)
+        self.requests = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        super().__exit__(*args)
+
+    @property
+    def root(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/myapi"
+
+    def records_of(self, endpoint: str) -> list[dict]:
+        if endpoint not in self.data:
+            self.data[endpoint] = synthetic_records(endpoint, self.records)
+        return self.data[endpoint]
+
+    def answer(self, method: str, path: str, query: str,
+               headers: dict) -> tuple:
+        """Returns: tuple: (status code, headers, body)"""
+        endpoint = path.strip("/").split("/")
+        endpoint = endpoint[1] if len(endpoint) > 1 else ""
+
+        if endpoint in ENDPOINTS and ENDPOINTS[endpoint].auth \
+                and headers.get("Authorization", "").removeprefix("JWT ") \
+                not in self.tokens:
+            return 401, {"Content-Type": "application/json"}, json.dumps(
+                {"detail": "Given token not valid for any token type"}
+            ).encode()
+
+        if endpoint in (envs.TOKEN, envs.TOKEN_REFRESH):
+            access = f"mock-access-{next(self._issued)}"
+            self.tokens.add(access)
+            body = {"access": access, "refresh": "mock-refresh"}
+        elif endpoint in (envs.RECORDS,):
+            body = {
+                "organisations": len(self.records_of(envs.ORGNAMEPUBLIC)),
+                "satellites": len(self.records_of(envs.SATELLITE)),
+                "weapons": len(self.records_of(envs.WEAPONSPUBLIC)),
+            }
+        elif endpoint in (envs.TAG,):
+            body = [{"name": tag} for tag in
+                    ("Agency", "Manufacturer", "Misc", "Launcher")]
+        elif endpoint in (envs.WEAPONSPUBLIC, envs.WEAPONS, envs.TAGLAWS):
+            body = self.records_of(endpoint)
+        else:
+            data = self.records_of(endpoint)
+            number = int(dict(parse_qsl(query)).get(envs.F_PAGE, 1))
+            pages = max(1, -(-len(data) // self.page_size))
+            url = f"{self.root}/{endpoint}/?{envs.F_PAGE}="
+            body = {
+                "count": len(data),
+                "next": f"{url}{number + 1}" if number < pages else None,
+                "previous": f"{url}{number - 1}" if number > 1 else None,
+                "results": data[(number - 1) * self.page_size:
+                                number * self.page_size],
+            }
+
+        return 200, {"Content-Type": "application/json"}, \
+            json.dumps(body).encode()
+
+
+class _MockApiHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _answer(self, method: str) -> None:
+        server = self.server
+        server.requests += 1
+        time.sleep(server.latency + random.random() * server.jitter)
+
+        url = urlparse(self.path)
+        if method == "POST":
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        status, headers, body = server.answer(method, url.path, url.query,
+                                              dict(self.headers))
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._answer("GET")
+
+    def do_POST(self) -> None:
+        self._answer("POST")
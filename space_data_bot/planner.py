@@ -0,0 +1,256 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+
+from space_data_bot import envs
+from space_data_bot.api import SpaceDataApi
+from space_data_bot.dataset import Dataset, Versions
+from space_data_bot.endpoints import Endpoint
+from space_data_bot.metrics import metrics
+from space_data_bot.tagindex import positions as bitmap_positions
+
+
+logger = logging.getLogger(__name__)
+
+# PREDICATES: how a filter is evaluated on a record
+EQUALS = "equals"  # same value, case insensitive
+CONTAINS = "contains"  # substring, case insensitive
+HAS_TAG = "has_tag"  # a single tag among the record tags
+
+# PLANS
+MIRROR = "mirror"  # the records held by the mirror are filtered
+CACHED = "cached"  # a cached response to some of the filters is refined
+UPSTREAM = "upstream"  # every filter is sent to recon.space
+
+# endpoint -> API filter -> (record key, predicate) of the filters that can
+# be evaluated locally
+LOCAL_FILTERS = {
+    envs.SATELLITE: {
+        envs.F_SATNAME: (envs.F_SATNAME, CONTAINS),
+        envs.F_SATCOUNTRY: (envs.F_SATCOUNTRY, EQUALS),
+        envs.F_SATORBIT: (envs.F_SATORBIT, EQUALS),
+        envs.F_SATVEHICLE: (envs.F_SATVEHICLE, EQUALS),
+    },
+    **{path: {envs.F_ORGNAME: ("organisationname", CONTAINS),
+              envs.F_TAG: ("tags", HAS_TAG)}
+       for path in (envs.ORGNAMEPUBLIC, envs.ORGNAMEGPSPUBLIC, envs.ORGNAME,
+                    envs.ORGNAMEGPS)},
+}
+# endpoint -> endpoint of the statistics used to estimate its selectivity
+STATS_SOURCES = {envs.SATELLITE: envs.SATELLITE,
+                 envs.ORGNAMEPUBLIC: envs.ORGNAMEPUBLIC,
+                 envs.ORGNAMEGPSPUBLIC: envs.ORGNAMEPUBLIC,
+                 envs.ORGNAME: envs.ORGNAMEPUBLIC,
+                 envs.ORGNAMEGPS: envs.ORGNAMEPUBLIC}
+
+
+@dataclass(frozen=True)
+class Plan:
+    """How a query is answered.
+
+    Attributes:
+        kind (str): MIRROR, CACHED or UPSTREAM.
+        query (dict): the filters of the query.
+        source (dict): the filters of the cached response refined by a
+            CACHED plan.
+        order (tuple): the filters evaluated locally, most selective first.
+        estimate (float): estimated fraction of the records matching.
+    """
+    kind: str
+    query: dict
+    source: dict = field(default_factory=dict)
+    order: tuple = ()
+    estimate: float = 1.0
+
+
+def _matches(predicate: str, value: str, expected: str) -> bool:
+    if value is None:
+        return False
+    if predicate == HAS_TAG:
+        return any(tag.casefold() == expected for tag in value)
+    if predicate == CONTAINS:
+        return expected in str(value).casefold()
+    return str(value).casefold() == expected
+
+
+def selectivity(dataset: Dataset, path: str, filter: str, value: str) -> float:
+    """Estimated fraction of the records of an endpoint matching a filter,
+    from the aggregates of the mirror."""
+    key, predicate = LOCAL_FILTERS[path][filter]
+    stats = dataset.stats.get(STATS_SOURCES.get(path)) if dataset else None
+
+    if predicate == CONTAINS or stats is None or key not in stats.counts \
+            or not stats.total:
+        return envs.PLAN_DEFAULT_SELECTIVITY
+    return stats.selectivity(key, value)
+
+
+def plan(endpoint: Endpoint, query: dict, dataset: Dataset,
+         cached) -> Plan:
+    """Chooses how to answer a query: from the mirror if it holds every
+    record of the endpoint, else by refining a cached response to the most
+    selective filters, else from recon.space.
+
+    Args:
+        endpoint (Endpoint): the endpoint of the query
+        query (dict): normalized API filters
+        dataset (Dataset): the mirror, None if not loaded
+        cached (Callable): returns the complete cached response to some
+            filters, or None
+
+    Returns:
+        Plan
+    """
+    local = LOCAL_FILTERS.get(endpoint.path, {})
+    if not query or not all(
+            filter in local and "," not in value and '"' not in value
+            for filter, value in query.items()):
+        return Plan(UPSTREAM, query)
+
+    estimates = {filter: selectivity(dataset, endpoint.path, filter, value)
+                 for filter, value in query.items()}
+    order = tuple(sorted(query, key=estimates.get))
+    estimate = 1.0
+    for value in estimates.values():  # filters assumed independent
+        estimate *= value
+
+    # the mirror must not be older than a cached response could be, and
+    # its records must have the keys of the filters
+    if dataset is not None and endpoint.path in dataset.complete \
+            and time.time() - dataset.synced \
+            <= endpoint.ttl + endpoint.stale_ttl \
+            and all(local[filter][0] in dataset.stores[endpoint.path].seen
+                    for filter in query):
+        return Plan(MIRROR, query, order=order, estimate=estimate)
+
+    # the most selective filter alone gives the smallest response to refine
+    for filter in order if len(query) > 1 else ():
+        if cached({filter: query[filter]}) is not None:
+            return Plan(CACHED, query, source={filter: query[filter]},
+                        order=tuple(f for f in order if f != filter),
+                        estimate=estimate)
+
+    return Plan(UPSTREAM, query, order=order, estimate=estimate)
+
+
+def refine(records: list[dict], path: str, query: dict,
+           order: tuple) -> list[dict]:
+    """The records matching the filters, evaluated in the given order."""
+    for filter in order:
+        key, predicate = LOCAL_FILTERS[path][filter]
+        expected = query[filter].casefold()
+        records = [elem for elem in records
+                   if _matches(predicate, elem.get(key), expected)]
+    return records
+
+
+def _scan(dataset: Dataset, path: str, query: dict, order: tuple) -> list:
+    """The positions of the mirrored records matching the filters. Tags are
+    selected with the bitmaps of the tag index, then the other filters are
+    checked on the remaining records, the most selective first."""
+    store = dataset.stores[path]
+    positions = range(len(store))
+
+    tagged = [f for f in order if LOCAL_FILTERS[path][f][1] == HAS_TAG]
+    if tagged:
+        try:
+            bitmap = dataset.select_tags(
+                path, " AND ".join(f'"{query[f]}"' for f in tagged))
+        except ValueError:  # a tag unknown to the mirror
+            return []
+        positions = bitmap_positions(bitmap)
+
+    for filter in order:
+        key, predicate = LOCAL_FILTERS[path][filter]
+        if predicate == HAS_TAG:
+            continue
+        expected = query[filter].casefold()
+        column = store.columns[key]
+        positions = [p for p in positions
+                     if _matches(predicate, column[p], expected)]
+    return positions
+
+
+def _page(records: list) -> dict:
+    """The shape of a recon.space page."""
+    return {"count": len(records), "next": None, "previous": None,
+            "results": records[:envs.PLAN_MAX_RESULTS]}
+
+
+def answer(api: SpaceDataApi, versions: Versions, endpoint: Endpoint,
+           token: str, args: dict) -> tuple:
+    """Answers a command without calling recon.space if a plan allows it.
+    Blocking, to be run in a thread.
+
+    Returns:
+        tuple: see SpaceDataApi.load(), None if recon.space must be called
+    """
+    query = endpoint.query(args)
+    if endpoint.path not in LOCAL_FILTERS or args.get("id") \
+            or (endpoint.auth and not api.trusted(token)):
+        return None
+
+    def cached(filters: dict):
+        """A cached response holding every record matching filters."""
+        sub_args = {arg: filters[filter] for arg, filter
+                    in endpoint.filters.items() if filter in filters}
+        response = api.cached(endpoint.path, token, **sub_args)
+        if response is None or isinstance(response[0], str):
+            return None
+        data = response[0]
+        if isinstance(data, dict) and (data.get("next")  # a first page only
+                                       or data.get("truncated")):
+            return None
+        return response
+
+    with versions.read() as dataset:
+        chosen = plan(endpoint, query, dataset, cached)
+        logger.debug("plan %s %s: %s, order %s, estimated selectivity %.4f",
+                     endpoint.path, query, chosen.kind, chosen.order,
+                     chosen.estimate)
+        metrics.incr("query_plan", endpoint=endpoint.path, plan=chosen.kind)
+
+        if chosen.kind == MIRROR:
+            positions = _scan(dataset, endpoint.path, query, chosen.order)
+            data = _page(dataset.stores[endpoint.path].to_dicts(
+                positions[:envs.PLAN_MAX_RESULTS]))
+            data["count"] = len(positions)
+            return data, 0, f"mirror:{versions.number}"
+
+    if chosen.kind == CACHED:
+        source = cached(chosen.source)
+        if source is not None:  # still cached
+            data, _, digest = source
+            records = data.get("results", []) if isinstance(data, dict) \
+                else data
+            keys = {LOCAL_FILTERS[endpoint.path][f][0] for f in chosen.order}
+            if any(not keys <= elem.keys() for elem in records):
+                return None  # the records do not have the filtered keys
+            return _page(refine(records, endpoint.path, query,
+                                chosen.order)), 0, digest
+
+    return None
@@ -0,0 +1,414 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import copy
+import json
+import sys
+from array import array
+from bisect import bisect_left
+
+from space_data_bot import envs
+
+
+# FIELD KINDS
+INT = "int"  # integer, stored in an array
+TEXT = "text"  # stored end to end in a single UTF-8 buffer
+SHARED = "shared"  # few distinct values, stored as a small integer code
+TAGS = "tags"  # list of tags, stored as small integer tag ids
+
+NULL_INT = -2 ** 63
+
+
+def _thawed(buffer: memoryview):
+    if buffer.format == "B":
+        return bytearray(buffer)
+    values = array(buffer.format)
+    values.frombytes(buffer.cast("B"))
+    return values
+
+
+def thaw(obj) -> None:
+    """Replaces the buffers of an object mapped from a snapshot, which are
+    read-only, by growable copies before the object is modified."""
+    for name, value in list(vars(obj).items()):
+        if isinstance(value, memoryview):
+            setattr(obj, name, _thawed(value))
+
+
+def clone(obj):
+    """A copy of a column or an index that can be modified without changing
+    the original, whose buffers may be mapped from a snapshot."""
+    result = object.__new__(type(obj))
+    for name, value in vars(obj).items():
+        if isinstance(value, memoryview):
+            value = _thawed(value)
+        elif isinstance(value, (array, bytearray, list, dict, set)):
+            value = copy.copy(value)
+        setattr(result, name, value)
+    return result
+
+
+class TagTable:
+    """Gives a small integer id to each tag name."""
+
+    def __init__(self) -> None:
+        self._ids = {}
+        self.names = []
+
+    def id(self, name: str) -> int:
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return self._ids[name]
+
+    def get(self, name: str) -> int:
+        """Returns: int: the id of a known tag, None otherwise"""
+        return self._ids.get(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+tags = TagTable()
+
+
+class IntColumn:
+
+    def __init__(self) -> None:
+        self.values = array("q")
+
+    def append(self, value) -> None:
+        self.values.append(NULL_INT if value is None else int(value))
+
+    def __setitem__(self, position: int, value) -> None:
+        self.values[position] = NULL_INT if value is None else int(value)
+
+    def __getitem__(self, position: int) -> int:
+        value = self.values[position]
+        return None if value == NULL_INT else value
+
+
+class TextColumn:
+    """Strings stored end to end in one buffer, without a Python object per
+    string. A replaced value is appended, the old bytes are left unused.
+    """
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.starts = array("I")
+        self.ends = array("I")  # start > end marks a None
+
+    def _store(self, value) -> tuple:
+        if value is None:
+            return 1, 0
+
+        start = len(self.data)
+        self.data += str(value).encode()
+        return start, len(self.data)
+
+    def append(self, value) -> None:
+        start, end = self._store(value)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __setitem__(self, position: int, value) -> None:
+        self.starts[position], self.ends[position] = self._store(value)
+
+    def __getitem__(self, position: int) -> str:
+        start, end = self.starts[position], self.ends[position]
+        if start > end:
+            return None
+        return str(self.data[start:end], "utf-8")
+
+
+class SharedColumn:
+    """Values repeated across records (types, countries, orbits...), stored
+    once and referenced by a 2-byte code."""
+
+    def __init__(self) -> None:
+        self.values = [None]
+        self._codes = {None: 0}
+        self.codes = array("H")
+
+    def code(self, value) -> int:
+        if value not in self._codes:
+            self._codes[value] = len(self.values)
+            self.values.append(sys.intern(value)
+                               if isinstance(value, str) else value)
+        return self._codes[value]
+
+    def append(self, value) -> None:
+        self.codes.append(self.code(value))
+
+    def __setitem__(self, position: int, value) -> None:
+        self.codes[position] = self.code(value)
+
+    def __getitem__(self, position: int):
+        return self.values[self.codes[position]]
+
+
+class TagsColumn:
+    """Lists of tags stored end to end as 2-byte tag ids."""
+
+    def __init__(self) -> None:
+        self.ids = array("H")
+        self.starts = array("I")
+        self.ends = array("I")  # start > end marks a None
+
+    def _store(self, value) -> tuple:
+        if value is None:
+            return 1, 0
+
+        start = len(self.ids)
+        self.ids.extend(tags.id(tag) for tag in value)
+        return start, len(self.ids)
+
+    def append(self, value) -> None:
+        start, end = self._store(value)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __setitem__(self, position: int, value) -> None:
+        self.starts[position], self.ends[position] = self._store(value)
+
+    def tag_ids(self, position: int) -> array:
+        start, end = self.starts[position], self.ends[position]
+        return self.ids[start:end] if start <= end else array("H")
+
+    def __getitem__(self, position: int) -> list:
+        start, end = self.starts[position], self.ends[position]
+        if start > end:
+            return None
+        return [tags.names[i] for i in self.ids[start:end]]
+
+
+class IdIndex:
+    """Maps record ids to positions. Integer ids are kept in two sorted
+    arrays rather than a dict, without a Python object per record; other ids
+    use a dict.
+    """
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.positions = array("I")
+        self._others = {}
+
+    def get(self, id) -> int:
+        if isinstance(id, int):
+            i = bisect_left(self.ids, id)
+            if i < len(self.ids) and self.ids[i] == id:
+                return self.positions[i]
+            return None
+
+        return self._others.get(id)
+
+    def add(self, id, position: int) -> None:
+        if not isinstance(id, int):
+            self._others[id] = position
+        elif not self.ids or id > self.ids[-1]:  # pages come sorted by id
+            self.ids.append(id)
+            self.positions.append(position)
+        else:
+            i = bisect_left(self.ids, id)
+            self.ids.insert(i, id)
+            self.positions.insert(i, position)
+
+
+COLUMNS = {INT: IntColumn, TEXT: TextColumn, SHARED: SharedColumn,
+           TAGS: TagsColumn}
+
+
+# SCHEMAS: (key, kind) of the known keys of a record, in the API order.
+# The first key identifies the record.
+ORGANISATION = (("id", INT), ("organisationname", TEXT), ("orgtype", SHARED),
+                ("description", TEXT), ("tags", TAGS))
+ORGANISATION_GPS = (("id", INT), ("organisationname", TEXT), ("tags", TAGS),
+                    ("gps", TEXT))
+SATELLITE = (("id", INT), (envs.F_SATNAME, TEXT), (envs.F_SATCOUNTRY, SHARED),
+             (envs.F_SATORBIT, SHARED), (envs.F_SATVEHICLE, SHARED))
+WEAPON = (("name", TEXT), ("description", TEXT), ("source", TEXT),
+          ("vectortype", SHARED))
+
+# endpoint -> schema of its records
+SCHEMAS = {
+    envs.ORGNAMEPUBLIC: ORGANISATION,
+    envs.ORGNAME: ORGANISATION,
+    envs.ORGNAMEGPSPUBLIC: ORGANISATION_GPS,
+    envs.ORGNAMEGPS: ORGANISATION_GPS,
+    envs.SATELLITE: SATELLITE,
+    envs.WEAPONSPUBLIC: WEAPON,
+    envs.WEAPONS: WEAPON,
+}
+
+
+class Record:
+    """A light view of a record of a RecordStore, eg: record.tags"""
+    __slots__ = ("_store", "position")
+
+    def __init__(self, store, position: int) -> None:
+        self._store = store
+        self.position = position
+
+    def __getattr__(self, key: str):
+        try:
+            return self._store.columns[key][self.position]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def to_dict(self) -> dict:
+        return self._store.to_dict(self.position)
+
+    def __repr__(self) -> str:
+        return f"Record({self.to_dict()!r})"
+
+
+class RecordStore:
+    """The records of one entity held in memory as one column per key
+    (struct of arrays) instead of one dict per record, and addressed by
+    their position. A record added again with the same id replaces the old
+    one. Keys outside the schema are kept as JSON in an "extra" column.
+
+    A store loaded from a snapshot is frozen: its columns are mapped from
+    the file until it is modified.
+    """
+
+    def __init__(self, schema: tuple) -> None:
+        self.schema = schema
+        self.key = schema[0][0]
+        self.columns = {key: COLUMNS[kind]() for key, kind in schema}
+        self._extra = TextColumn()
+        self._positions = IdIndex()
+        self._size = 0
+        self.seen = set()  # schema keys found in at least one record
+        self.frozen = False
+
+    def thaw(self) -> None:
+        for column in (*self.columns.values(), self._extra, self._positions):
+            thaw(column)
+        self.frozen = False
+
+    def copy(self):
+        """A copy of the store, modified without changing this one."""
+        store = clone(self)
+        store.columns = {key: clone(column)
+                         for key, column in self.columns.items()}
+        store._extra = clone(self._extra)
+        store._positions = clone(self._positions)
+        store.frozen = False
+        return store
+
+    def add(self, data: dict) -> int:
+        """Returns: int: the position of the record"""
+        if self.frozen:
+            self.thaw()
+
+        extra = {k: v for k, v in data.items() if k not in self.columns}
+        extra = json.dumps(extra) if extra else None
+        if len(self.seen) < len(self.columns):
+            self.seen.update(k for k in data if k in self.columns)
+
+        id = data.get(self.key)
+        position = self._positions.get(id)
+
+        if position is None:
+            position = self._size
+            for key, column in self.columns.items():
+                column.append(data.get(key))
+            self._extra.append(extra)
+            self._size += 1
+            if id is not None:
+                self._positions.add(id, position)
+        else:
+            for key, column in self.columns.items():
+                column[position] = data.get(key)
+            self._extra[position] = extra
+
+        return position
+
+    def extend(self, data: list[dict]) -> list[int]:
+        return [self.add(elem) for elem in data]
+
+    def position(self, id) -> int:
+        return self._positions.get(id)
+
+    def to_dict(self, position: int) -> dict:
+        """The dict shape returned by the API, only built to render a
+        record, eg: with content.data_message."""
+        data = {key: self.columns[key][position] for key, _ in self.schema}
+
+        extra = self._extra[position]
+        if extra:
+            data.update(json.loads(extra))
+        return data
+
+    def to_dicts(self, positions=None) -> list[dict]:
+        if positions is None:
+            positions = range(self._size)
+        return [self.to_dict(p) for p in positions]
+
+    def __getitem__(self, position: int) -> Record:
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        return Record(self, position)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return (Record(self, p) for p in range(self._size))
+
+
+if __name__ == "__main__":
+    # Memory benchmark: 100k organisations as decoded JSON vs as records
+    import gc
+    import tracemalloc
+    from space_data_bot.mockapi import synthetic_records
+
+    number = 100_000
+    payload = json.dumps(synthetic_records(envs.ORGNAMEPUBLIC, number))
+
+    def traced(_built) -> int:
+        # the argument keeps the built data alive while it is measured
+        size, _ = tracemalloc.get_traced_memory()
+        return size
+
+    def measure(build) -> int:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            return traced(build())
+        finally:
+            tracemalloc.stop()
+
+    def as_records() -> RecordStore:
+        store = RecordStore(ORGANISATION)
+        for elem in json.loads(payload):
+            store.add(elem)
+        return store
+
+    dicts = measure(lambda: json.loads(payload))
+    records = measure(as_records)
+    print(f"{number} organisations as dicts:   {dicts / 2**20:7.1f} MB")
+    print(f"{number} organisations as records: {records / 2**20:7.1f} MB")
+    print(f"{dicts / records:.1f}x smaller")
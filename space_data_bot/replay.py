@@ -0,0 +1,281 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Replay of a capture recorded with SPACEDATA_CAPTURE, against a local stand-in
+of recon.space, eg:
+python -m space_data_bot.replay capture.jsonl --speed 4 \
+    --snapshot spacedata.snapshot --output after.json --baseline before.json
+
+The commands are sent at their recorded offsets divided by --speed, and each
+request is answered with its recorded response, after its recorded duration
+divided by --speed. Replaying the same capture on two commits gives two
+reports to compare, with --baseline or with diff. The commands answered
+from the mirror are only replayed if a --snapshot is given.
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict, deque
+
+from space_data_bot import snapshot
+from space_data_bot.capture import API_ROOT, read, request_key
+from space_data_bot.dataset import Dataset
+from space_data_bot.loadtest import FakeInteraction, memory, \
+    mocked_bot, percentile
+from space_data_bot.metrics import metrics
+from space_data_bot.mockapi import MockApiServer
+
+
+NOT_REPLAYED = {"connect"}  # its credentials are not recorded
+MIRROR_COMMANDS = {"tagsearch", "stats"}  # answered from the mirror only
+VALIDATORS = ("If-None-Match", "If-Modified-Since")
+
+
+class ReplayServer(MockApiServer):
+    """Answers each request with the responses recorded for it, in their
+    order, starting again from the first one if the bot asks more often than
+    in the capture. Requests missing from the capture, and bodies too large
+    to be recorded, are answered with synthetic records.
+    """
+
+    def __init__(self, events: list[dict], speed: float = 1.0,
+                 **kwargs) -> None:
+        """
+        Args:
+            events (list[dict]): the events of a capture.
+            speed (float, optional): divides the recorded durations.
+        """
+        self.speed = speed
+        self.responses = defaultdict(deque)  # request key -> responses
+        for event in events:
+            if event["type"] == "request":
+                self.responses[event["key"]].append(event)
+        self.replayed = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _next(self, key: str, headers: dict) -> dict:
+        """The next recorded response of a request, None if there is none.
+        A 304 needs the cached copy of the bot: without validators in the
+        request, the next recorded body is answered instead."""
+        revalidating = any(name in headers for name in VALIDATORS)
+        with self._lock:
+            responses = self.responses.get(key, ())
+            for _ in range(len(responses)):
+                event = responses[0]
+                responses.rotate(-1)
+                if event["status"] == 304 and not revalidating:
+                    continue
+                if event["status"] == 200 and event["body"] is None:
+                    continue
+                self.replayed += 1
+                return event
+
+            self.missed += 1
+
+    def answer(self, method: str, path: str, query: str,
+               headers: dict) -> tuple:
+        event = self._next(request_key(path, query), headers)
+        if event is None:
+            return super().answer(method, path, query, headers)
+
+        time.sleep(event["seconds"] / self.speed)
+        answer_headers = {"Content-Type": "application/json"}
+        if event["etag"]:
+            answer_headers["ETag"] = event["etag"]
+
+        body = b""
+        if event["status"] != 304 and event["body"] is not None:
+            body = json.dumps(event["body"]).replace(API_ROOT, self.root) \
+                .encode()
+        return event["status"], answer_headers, body
+
+
+async def replay(tree, commands: list[dict], speed: float,
+                 users: dict) -> dict:
+    """Sends the recorded commands at their offsets divided by speed, and
+    waits for all of them.
+
+    Returns:
+        dict: the report, see chart
+    """
+    sent = defaultdict(list)  # command -> interactions
+    failed = defaultdict(int)
+    tasks = []
+
+    async def invoke(event: dict) -> None:
+        interaction = FakeInteraction(users[event["user"]])
+        sent[event["command"]].append(interaction)
+        command = tree.get_command(event["command"])
+        try:
+            if command is None:
+                raise LookupError(f"unknown command: {event['command']}")
+            await command.callback(interaction, **event["args"])
+        except Exception:  # eg: arguments changed since the capture
+            failed[event["command"]] += 1
+
+    metrics.reset()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+    first = commands[0]["t"] if commands else 0
+    start = time.perf_counter()
+    for event in commands:
+        delay = start + (event["t"] - first) / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(invoke(event)))
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    report = {"commands": {}, "elapsed": elapsed}
+    for name, interactions in sorted(sent.items()):
+        answers = [i.answered - i.created for i in interactions
+                   if i.answered]
+        report["commands"][name] = {
+            "sent": len(interactions),
+            "failed": failed[name],
+            "answer_p50": percentile(answers, 50),
+            "answer_p99": percentile(answers, 99),
+            "peak_p99": metrics.percentile("command_peak_bytes", 99,
+                                           command=name),
+        }
+
+    answered = sum(1 for interactions in sent.values()
+                   for i in interactions if i.answered)
+    report["throughput"] = answered / elapsed if elapsed else 0.0
+    report["loop_lag_p99"] = metrics.percentile("loop_lag_seconds", 99)
+    report["memory"] = memory()
+    report["traced_peak"] = tracemalloc.get_traced_memory()[1] \
+        if tracemalloc.is_tracing() else 0
+    return report
+
+
+def _change(new: float, old: float) -> str:
+    if not old:
+        return ""
+    return f" ({(new - old) / old:+.0%})"
+
+
+def chart(report: dict, baseline: dict = None) -> str:
+    """A text table of the report, with the change from a baseline report
+    for each command replayed in both."""
+    baseline = baseline or {"commands": {}}
+    lines = [f"{'command':<18} {'sent':>5} {'failed':>6} {'p50':>7} "
+             f"{'p99':>7} {'peak KB':>8}  p99 change"]
+    for name, r in report["commands"].items():
+        old = baseline["commands"].get(name, {})
+        lines.append(
+            f"{name:<18} {r['sent']:>5} {r['failed']:>6} "
+            f"{r['answer_p50']:>7.3f} {r['answer_p99']:>7.3f} "
+            f"{r['peak_p99'] / 2**10:>8.1f} "
+            f"{_change(r['answer_p99'], old.get('answer_p99', 0))}")
+
+    for name, number in report.get("skipped", {}).items():
+        reason = "no --snapshot" if name in MIRROR_COMMANDS \
+            else "credentials not recorded"
+        lines.append(f"{name:<18} {number:>5} not replayed: {reason}")
+
+    lines.append("")
+    for key, name, unit, scale, digits in (
+            ("elapsed", "elapsed", "s", 1, 3),
+            ("throughput", "throughput", "commands/s", 1, 1),
+            ("loop_lag_p99", "loop lag p99", "s", 1, 3),
+            ("memory", "RSS", "MB", 2**20, 1),
+            ("traced_peak", "traced peak", "MB", 2**20, 1),
+            ("upstream", "upstream requests", "", 1, 0),
+            ("missed", "not in the capture", "", 1, 0)):
+        value = report.get(key, 0)
+        lines.append(f"{name:<18} {value / scale:>10.{digits}f} {unit:<10}"
+                     f"{_change(value, baseline.get(key, 0))}")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+async def main(args: argparse.Namespace) -> dict:
+    events = read(args.capture)
+    skipped = NOT_REPLAYED if args.snapshot else NOT_REPLAYED | MIRROR_COMMANDS
+    commands = [event for event in events if event["type"] == "command"
+                and event["command"] not in skipped]
+    users = {user: number for number, user in
+             enumerate(sorted({event["user"] for event in commands}))}
+
+    with ReplayServer(events, speed=args.speed,
+                      records=args.records) as server, \
+            mocked_bot(server.root, users.values(),
+                       args.trace_memory) as bot:
+        if args.snapshot:
+            loaded = snapshot.load(args.snapshot, Dataset)
+            if loaded is None:
+                raise SystemExit(f"cannot load the snapshot {args.snapshot}")
+            bot.client.mirror.versions.publish(loaded[0])
+
+        report = await replay(bot.client.tree, commands, args.speed, users)
+
+        report["upstream"] = server.requests
+        report["missed"] = server.missed
+        report["skipped"] = dict(sorted(Counter(
+            event["command"] for event in events
+            if event["type"] == "command"
+            and event["command"] in skipped).items()))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print(chart(report, baseline))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replays a capture of the bot against a mock API.")
+    parser.add_argument("capture", help="a file recorded with "
+                        "SPACEDATA_CAPTURE")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="acceleration of the recorded timing")
+    parser.add_argument("--records", type=int, default=20,
+                        help="synthetic records of the requests missing "
+                        "from the capture")
+    parser.add_argument("--output", help="JSON report to write, "
+                        "eg: to compare the next commit with --baseline")
+    parser.add_argument("--baseline", help="JSON report of a previous "
+                        "replay of the same capture")
+    parser.add_argument("--snapshot", help="mirror snapshot, to replay "
+                        "/tagsearch and /stats too")
+    parser.add_argument("--trace-memory",
+                        action=argparse.BooleanOptionalAction, default=True,
+                        help="measure the peak memory of each command")
+    asyncio.run(main(parser.parse_args()))
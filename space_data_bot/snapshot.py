@@ -0,0 +1,244 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from space_data_bot import records
+from space_data_bot.records import SCHEMAS, SHARED, TAGS, tags
+
+
+# File layout: MAGIC, length of the JSON header (8 bytes), JSON header,
+# padding, then the buffers of the columns and indexes, each aligned on 8
+# bytes and referenced in the header as [offset, format, length].
+MAGIC = b"SDSNAP01"
+ALIGN = 8
+# buffers of each column kind
+BUFFERS = {records.INT: ("values",), records.TEXT: ("data", "starts", "ends"),
+           SHARED: ("codes",), TAGS: ("ids", "starts", "ends")}
+
+
+def _platform() -> dict:
+    """Buffers are stored in the native byte order and sizes."""
+    return {"byteorder": sys.byteorder,
+            "itemsizes": {code: array(code).itemsize for code in "HIq"}}
+
+
+class _Buffers:
+
+    def __init__(self) -> None:
+        self.chunks = []
+        self.size = 0
+
+    def add(self, buffer) -> list:
+        view = memoryview(buffer)
+        self.size += -self.size % ALIGN
+        ref = [self.size, view.format, len(view)]
+        self.chunks.append((self.size, view.cast("B")))
+        self.size += view.nbytes
+        return ref
+
+
+def save(dataset, file: str) -> None:
+    """Writes a dataset.Dataset in a snapshot file, replaced atomically so
+    that processes mapping the old file keep reading it."""
+    buffers = _Buffers()
+    header = {"created": time.time(), "platform": _platform(),
+              "tags": tags.names, "complete": sorted(dataset.complete),
+              "synced": dataset.synced,
+              "stores": {}, "tag_indexes": {}, "stats": {}}
+
+    for path, store in dataset.stores.items():
+        columns = {}
+        for key, kind in store.schema:
+            column = store.columns[key]
+            columns[key] = {name: buffers.add(getattr(column, name))
+                            for name in BUFFERS[kind]}
+            if kind == SHARED:
+                columns[key]["values"] = column.values
+
+        positions = store._positions
+        header["stores"][path] = {
+            "size": len(store),
+            "seen": sorted(store.seen),
+            "columns": columns,
+            "extra": {name: buffers.add(getattr(store._extra, name))
+                      for name in BUFFERS[records.TEXT]},
+            "ids": buffers.add(positions.ids),
+            "positions": buffers.add(positions.positions),
+            "others": list(positions._others.items()),
+        }
+
+    for path, index in dataset.tag_indexes.items():
+        header["tag_indexes"][path] = {
+            "size": index.size,
+            "bitmaps": {tag: buffers.add(bitmap)
+                        for tag, bitmap in index._bytes.items()},
+        }
+
+    for path, stats in dataset.stats.items():
+        header["stats"][path] = {
+            "total": stats.total,
+            "counts": {key: stats.items(key) for key in stats.counts},
+        }
+
+    text = json.dumps(header).encode()
+    start = len(MAGIC) + 8 + len(text)
+    start += -start % ALIGN
+
+    tmp = f"{file}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as out:
+        out.write(MAGIC + struct.pack("<Q", len(text)) + text)
+        for offset, chunk in buffers.chunks:
+            out.seek(start + offset)
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, file)
+
+
+def load(file: str, cls) -> tuple:
+    """Maps a snapshot file. Nothing is read but the header: the pages of
+    the buffers are loaded by the OS on first access, and shared by the
+    processes mapping the same file.
+
+    Args:
+        file (str): the snapshot file
+        cls (type): dataset.Dataset, created with the endpoints of the
+            snapshot
+
+    Returns:
+        tuple: (Dataset, creation time), None if there is no usable
+            snapshot
+    """
+    try:
+        with open(file, "rb") as data:
+            mapped = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # missing or empty
+        return None
+
+    if mapped[:len(MAGIC)] != MAGIC:
+        return None
+    length, = struct.unpack("<Q", mapped[len(MAGIC):len(MAGIC) + 8])
+    header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+    if header["platform"] != _platform():
+        return None
+
+    start = len(MAGIC) + 8 + length
+    start += -start % ALIGN
+    view = memoryview(mapped)
+
+    def buffer(ref: list) -> memoryview:
+        offset, format, number = ref
+        size = number * (array(format).itemsize if format != "B" else 1)
+        data = view[start + offset:start + offset + size]
+        return data if format == "B" else data.cast(format)
+
+    # tag ids of this process, which may differ from the snapshot ones
+    tag_ids = [tags.id(name) for name in header["tags"]]
+    remap = tag_ids != list(range(len(tag_ids)))
+
+    dataset = cls(tuple(header["stores"]))
+    dataset.complete.update(header["complete"])
+    dataset.synced = header.get("synced", header["created"])
+    for path, data in header["stores"].items():
+        store = dataset.stores[path]
+        for key, kind in SCHEMAS[path]:
+            column = store.columns[key]
+            for name in BUFFERS[kind]:
+                setattr(column, name, buffer(data["columns"][key][name]))
+            if kind == SHARED:
+                column.values = data["columns"][key]["values"]
+                column._codes = {value: code for code, value
+                                 in enumerate(column.values)}
+            elif kind == TAGS and remap:
+                column.ids = array("H", (tag_ids[i] for i in column.ids))
+
+        for name in BUFFERS[records.TEXT]:
+            setattr(store._extra, name, buffer(data["extra"][name]))
+        store._positions.ids = buffer(data["ids"])
+        store._positions.positions = buffer(data["positions"])
+        store._positions._others = dict(data["others"])
+        store._size = data["size"]
+        store.seen = set(data.get("seen", ()))
+        store.frozen = True
+
+    for path, data in header["tag_indexes"].items():
+        index = dataset.tag_indexes[path]
+        index.size = data["size"]
+        index._bytes = {tag_ids[int(tag)]: buffer(ref)
+                        for tag, ref in data["bitmaps"].items()}
+
+    for path, data in header["stats"].items():
+        stats = dataset.stats[path]
+        stats.total = data["total"]
+        for key, counts in data["counts"].items():
+            for value, number in counts:
+                stats.increment(key, value, number)
+
+    return dataset, header["created"]
+
+
+if __name__ == "__main__":
+    # Startup benchmark: 100k organisations parsed from JSON vs mapped
+    import tempfile
+    from space_data_bot import envs
+    from space_data_bot.dataset import Dataset
+    from space_data_bot.mockapi import synthetic_records
+
+    number = 100_000
+    payload = json.dumps(synthetic_records(envs.ORGNAMEPUBLIC, number))
+
+    begin = time.perf_counter()
+    dataset = Dataset((envs.ORGNAMEPUBLIC,))
+    dataset.add(envs.ORGNAMEPUBLIC, json.loads(payload))
+    built = time.perf_counter() - begin
+
+    with tempfile.TemporaryDirectory() as folder:
+        file = os.path.join(folder, "spacedata.snapshot")
+        save(dataset, file)
+        size = os.path.getsize(file)
+
+        begin = time.perf_counter()
+        loaded, _ = load(file, Dataset)
+        mapped = time.perf_counter() - begin
+        count = loaded.select_tags(envs.ORGNAMEPUBLIC, "Agency").bit_count()
+        first = time.perf_counter() - begin
+
+        store = loaded.stores[envs.ORGNAMEPUBLIC]
+        assert store.to_dicts(range(0, number, 997)) == \
+            dataset.stores[envs.ORGNAMEPUBLIC].to_dicts(range(0, number, 997))
+        assert count == dataset.select_tags(envs.ORGNAMEPUBLIC,
+                                            "Agency").bit_count()
+        del loaded, store
+
+    print(f"{number} organisations from JSON:      {built * 1000:8.1f} ms")
+    print(f"{number} organisations from snapshot:  {mapped * 1000:8.1f} ms "
+          f"({size / 2**20:.1f} MB file)")
+    print(f"first tag query included:         {first * 1000:8.1f} ms")
@@ -0,0 +1,112 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from collections import Counter
+
+from space_data_bot import envs
+
+
+# endpoint -> keys counted for each of its records
+STATS_KEYS = {
+    envs.ORGNAMEPUBLIC: ("tags", "orgtype"),
+    envs.SATELLITE: (envs.F_SATORBIT, envs.F_SATCOUNTRY, envs.F_SATVEHICLE),
+}
+
+
+class Aggregates:
+    """Number of records per value of some keys (a materialized view),
+    updated record by record so that no query has to scan the records.
+    Keys holding lists, like tags, count each of their values.
+
+    Values are counted case insensitively like the recon.space filters,
+    under their case-folded form, and listed under their first spelling.
+    """
+
+    def __init__(self, keys: tuple) -> None:
+        self.counts = {key: Counter() for key in keys}  # folded value
+        self.names = {key: {} for key in keys}  # folded value -> value
+        self.total = 0
+
+    def _update(self, values: dict, sign: int) -> None:
+        for key in self.counts:
+            value = values.get(key)
+            if value is None:
+                continue
+
+            for elem in value if isinstance(value, (list, tuple)) \
+                    else (value,):
+                self.increment(key, elem, sign)
+
+        self.total += sign
+
+    def increment(self, key: str, value, number: int = 1) -> None:
+        """Adds number to the count of a value, negative to remove it."""
+        counter, names = self.counts[key], self.names[key]
+        folded = str(value).casefold()
+        names.setdefault(folded, value)
+        counter[folded] += number
+        if counter[folded] <= 0:
+            del counter[folded]
+            del names[folded]
+
+    def copy(self):
+        aggregates = Aggregates(tuple(self.counts))
+        aggregates.counts = {key: Counter(counter)
+                             for key, counter in self.counts.items()}
+        aggregates.names = {key: dict(names)
+                            for key, names in self.names.items()}
+        aggregates.total = self.total
+        return aggregates
+
+    def add(self, values: dict) -> None:
+        """Counts a record, given the values of its keys."""
+        self._update(values, 1)
+
+    def remove(self, values: dict) -> None:
+        """Uncounts a record replaced or deleted."""
+        self._update(values, -1)
+
+    def count(self, key: str, value) -> int:
+        """Records holding a value, compared case insensitively like the
+        recon.space filters."""
+        return self.counts[key][str(value).casefold()]
+
+    def items(self, key: str) -> list[tuple]:
+        """Returns: list[tuple]: every (value, count) of a key"""
+        names = self.names[key]
+        return [(names[folded], number)
+                for folded, number in self.counts[key].items()]
+
+    def top(self, key: str, number: int = 10) -> list[tuple]:
+        """Returns: list[tuple]: the most frequent (value, count)"""
+        names = self.names[key]
+        return [(names[folded], count) for folded, count
+                in self.counts[key].most_common(number)]
+
+    def selectivity(self, key: str, value) -> float:
+        """Fraction of the records holding a value, 1 if nothing is
+        counted."""
+        if not self.total:
+            return 1.0
+        return self.count(key, value) / self.total
@@ -0,0 +1,266 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+
+from space_data_bot import records
+
+
+class TagIndex:
+    """Maps each tag to a bitmap of the positions of the records holding it
+    in a RecordStore, so that tag expressions are evaluated with bitwise
+    operations.
+
+    Bitmaps are built in bytearrays and converted to Python integers, on
+    which &, | and ~ run in C, the first time they are queried.
+    """
+
+    def __init__(self) -> None:
+        self._bytes = {}  # tag id -> bytearray, bit n = position n
+        # (a read-only memoryview when mapped from a snapshot)
+        self._bitmaps = {}  # tag id -> int, built on demand
+        self.size = 0  # number of positions
+
+    def set(self, position: int, tag_ids, old_tag_ids=()) -> None:
+        """Indexes the tags of the record at a position, replacing the tags
+        it had before."""
+        byte, bit = divmod(position, 8)
+        self.size = max(self.size, position + 1)
+
+        for tag in old_tag_ids:
+            self._writable(tag)[byte] &= ~(1 << bit)
+            self._bitmaps.pop(tag, None)
+
+        for tag in tag_ids:
+            bitmap = self._writable(tag)
+            if len(bitmap) <= byte:
+                bitmap.extend(bytes(byte + 1 - len(bitmap)))
+            bitmap[byte] |= 1 << bit
+            self._bitmaps.pop(tag, None)
+
+    def copy(self):
+        """A copy of the index, modified without changing this one: the
+        bitmaps are shared read-only until they are written."""
+        index = records.clone(self)
+        index._bytes = {tag: memoryview(bitmap).toreadonly()
+                        for tag, bitmap in self._bytes.items()}
+        return index
+
+    def _writable(self, tag_id: int) -> bytearray:
+        """The bytes of a tag, copied if mapped from a snapshot."""
+        bitmap = self._bytes.get(tag_id)
+        if not isinstance(bitmap, bytearray):
+            bitmap = self._bytes[tag_id] = bytearray(bitmap or b"")
+        return bitmap
+
+    @classmethod
+    def build(cls, store: records.RecordStore, key: str = "tags"):
+        index = cls()
+        column = store.columns[key]
+        for position in range(len(store)):
+            index.set(position, column.tag_ids(position))
+        return index
+
+    def bitmap(self, tag_id: int) -> int:
+        if tag_id not in self._bitmaps:
+            self._bitmaps[tag_id] = int.from_bytes(
+                self._bytes.get(tag_id, b""), "little")
+        return self._bitmaps[tag_id]
+
+    def all(self) -> int:
+        return (1 << self.size) - 1
+
+    def select(self, expression: str) -> int:
+        """Evaluates a tag expression, eg: "Agency AND NOT (Misc OR
+        Launcher)", see parse().
+
+        Returns:
+            int: the bitmap of the matching positions
+        """
+        return parse(expression)(self)
+
+
+def positions(bitmap: int, limit: int = None) -> list[int]:
+    """The positions set in a bitmap, in increasing order."""
+    result = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            result.append(byte_index * 8 + low.bit_length() - 1)
+            if limit is not None and len(result) >= limit:
+                return result
+            byte ^= low
+
+    return result
+
+
+_TOKENS = re.compile(r'\s*(\(|\)|&|\||!|,|"[^"]*"|[^()&|!,"]+)')
+_KEYWORDS = {"and": "&", "or": "|", "not": "!"}
+
+
+def _tokenize(expression: str) -> list[str]:
+    tokens = []
+    for token in _TOKENS.findall(expression):
+        token = token.strip()
+        if token.startswith('"'):
+            tokens.append(("tag", token.strip('"')))
+        elif token in "()&|!,":
+            tokens.append(("op", "|" if token == "," else token))
+        else:
+            # a run of words: keywords split the tag names
+            words = []
+            for word in token.split():
+                if word.lower() in _KEYWORDS:
+                    if words:
+                        tokens.append(("tag", " ".join(words)))
+                        words = []
+                    tokens.append(("op", _KEYWORDS[word.lower()]))
+                else:
+                    words.append(word)
+            if words:
+                tokens.append(("tag", " ".join(words)))
+    return tokens
+
+
+def parse(expression: str):
+    """Compiles a tag expression into a function of a TagIndex returning a
+    bitmap. Tags are case insensitive; operators, by increasing priority:
+    OR (or | or ,), AND (or &), NOT (or !), and parentheses. A tag holding
+    one of these words is quoted, eg: "Agency, Manufacturer AND NOT Misc",
+    '"Not Applicable" OR Misc'
+
+    Raises:
+        ValueError: the expression is malformed, or the function is called
+            with tags that are unknown, eg: misspelled
+    """
+    tokens = _tokenize(expression)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else (None, None)
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def or_expr():
+        terms = [and_expr()]
+        while peek() == ("op", "|"):
+            take()
+            terms.append(and_expr())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda index: _fold(terms, index, int.__or__)
+
+    def and_expr():
+        factors = [not_expr()]
+        while peek() == ("op", "&"):
+            take()
+            factors.append(not_expr())
+        if len(factors) == 1:
+            return factors[0]
+        return lambda index: _fold(factors, index, int.__and__)
+
+    def not_expr():
+        kind, value = peek()
+        if (kind, value) == ("op", "!"):
+            take()
+            operand = not_expr()
+            return lambda index: index.all() & ~operand(index)
+        if (kind, value) == ("op", "("):
+            take()
+            inner = or_expr()
+            if take() != ("op", ")"):
+                raise ValueError(f"missing ')' in {expression!r}")
+            return inner
+        if kind == "tag":
+            take()
+            return lambda index: index.bitmap(_tag_id(value))
+        if kind is None:
+            raise ValueError(f"incomplete tag expression: {expression!r}")
+        raise ValueError(f"unexpected {value!r} in {expression!r}")
+
+    if not tokens:
+        raise ValueError("empty tag expression")
+
+    try:
+        tree = or_expr()
+    except IndexError:  # a missing ')'
+        raise ValueError(f"incomplete tag expression: {expression!r}") \
+            from None
+
+    if position != len(tokens):
+        raise ValueError(f"unexpected {tokens[position][1]!r} in "
+                         f"{expression!r}")
+
+    names = [value for kind, value in tokens if kind == "tag"]
+
+    def select(index: TagIndex) -> int:
+        # checked when called: tags are registered as records are added
+        unknown = [name for name in names if _tag_id(name) is None]
+        if unknown:
+            raise ValueError("unknown tag" + "s" * (len(unknown) > 1) + ": "
+                             + ", ".join(repr(name) for name in unknown))
+        return tree(index)
+
+    return select
+
+
+def _fold(operands: list, index: TagIndex, operator) -> int:
+    result = operands[0](index)
+    for operand in operands[1:]:
+        result = operator(result, operand(index))
+    return result
+
+
+def _tag_id(name: str) -> int:
+    """Returns: int: the id of a tag, None if unknown"""
+    tag_id = records.tags.get(name)
+    if tag_id is None:  # tags are case insensitive
+        name = name.casefold()
+        tag_id = next((i for i, tag in enumerate(records.tags.names)
+                       if tag.casefold() == name), None)
+    return tag_id
+
+
+if __name__ == "__main__":
+    # Benchmark: combined tag queries over 100k organisations
+    import timeit
+    from space_data_bot import envs
+    from space_data_bot.mockapi import synthetic_records
+
+    store = records.RecordStore(records.ORGANISATION)
+    store.extend(synthetic_records(envs.ORGNAMEPUBLIC, 100_000))
+    index = TagIndex.build(store)
+
+    for expression in ("Agency", "Agency AND Manufacturer",
+                       "(Agency OR Launcher) AND NOT Misc"):
+        compiled = parse(expression)
+        seconds = min(timeit.repeat(lambda: compiled(index), number=100,
+                                    repeat=3)) / 100
+        count = compiled(index).bit_count()
+        print(f"{expression!r}: {count} records in {seconds * 1e6:.0f} µs")
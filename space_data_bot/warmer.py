@@ -0,0 +1,101 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import logging
+from urllib.parse import parse_qsl
+
+from space_data_bot import envs
+from space_data_bot.api import SpaceDataApi
+from space_data_bot.endpoints import ENDPOINTS
+from space_data_bot.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_queries(text: str) -> list[tuple]:
+    """Parses envs.WARM_QUERIES, ignoring the endpoints that are unknown or
+    require an account.
+
+    Returns:
+        list[tuple]: (endpoint path, command arguments)
+    """
+    queries = []
+    for query in text.split():
+        path, _, args = query.partition("?")
+        endpoint = ENDPOINTS.get(path)
+
+        if endpoint is None or endpoint.auth:
+            logger.warning("cannot warm %s, not a public endpoint", query)
+            continue
+
+        queries.append((path, dict(parse_qsl(args))))
+
+    return queries
+
+
+class CacheWarmer:
+    """Prefetches the hot queries and refreshes them before they expire, so
+    that users always get them at cache speed.
+
+    When several bot processes share the cache, a query refreshed by one of
+    them is skipped by the others.
+    """
+
+    def __init__(self, api: SpaceDataApi, queries: list[tuple] = None,
+                 interval: float = envs.WARM_INTERVAL,
+                 ahead: float = envs.WARM_AHEAD) -> None:
+        self._api = api
+        self._queries = queries if queries is not None \
+            else parse_queries(envs.WARM_QUERIES)
+        self._interval = interval
+        self._ahead = ahead
+        self._task = None
+
+    async def warm(self) -> None:
+        """Refreshes the hot queries expiring in less than `ahead`
+        seconds."""
+        for path, args in self._queries:
+            # requests are blocking, they must not hold the event loop
+            cached = await asyncio.to_thread(self._api.refresh, path,
+                                             margin=self._ahead, **args)
+            metrics.incr("warmer_refresh", endpoint=path, ok=cached)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.warm()
+            except Exception:
+                logger.exception("cache warmer failed")
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="warmer")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,145 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+
+from space_data_bot import envs
+from space_data_bot.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+_commands = weakref.WeakKeyDictionary()  # task -> running command
+
+
+@contextmanager
+def track(command: str):
+    """Marks the current task as running a command, so that the watchdog
+    can name the command blocking the event loop.
+
+    While tracemalloc traces (envs.TRACE_MEMORY), the memory allocated at
+    the peak of the command is also observed. Commands running at the same
+    time are counted in each other's peak: it is an upper bound under load.
+    """
+    task = asyncio.current_task()
+    _commands[task] = command
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if len(_commands) == 1:  # the peak of the previous commands
+            tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        _commands.pop(task, None)
+        if tracing and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            metrics.observe("command_peak_bytes", max(0, peak - start),
+                            command=command)
+
+
+class LoopWatchdog:
+    """Measures the lag of the event loop continuously.
+
+    A task on the loop measures how late its sleeps wake up, and a thread
+    checks that this task keeps beating: while the loop is blocked, the
+    thread captures the stack of the loop and the command being run, and
+    reports them through the logs and the metrics.
+    """
+
+    def __init__(self, interval: float = envs.LAG_INTERVAL,
+                 threshold: float = envs.LAG_THRESHOLD) -> None:
+        self._interval = interval
+        self._threshold = threshold
+        self._loop = None
+        self._loop_thread = None
+        self._beat = time.monotonic()
+        self._task = None
+        self._stopped = threading.Event()
+        self._blocked = None  # command reported for the current stall
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start = self._loop.time()
+            await asyncio.sleep(self._interval)
+            lag = self._loop.time() - start - self._interval
+            self._beat = time.monotonic()
+
+            metrics.observe("loop_lag_seconds", lag)
+            metrics.gauge("loop_lag_seconds", lag)
+            if lag > self._threshold:
+                logger.warning("event loop blocked for %.3fs by %s", lag,
+                               self._blocked or "an unknown task")
+            self._blocked = None
+
+    def _monitor(self) -> None:
+        while not self._stopped.wait(self._interval / 2):
+            late = time.monotonic() - self._beat - self._interval
+            if late > self._threshold and self._blocked is None:
+                self._report(late)
+
+    def _report(self, late: float) -> None:
+        """Reports the frame blocking the loop, once per stall."""
+        task = asyncio.current_task(self._loop)
+        command = _commands.get(task) if task else None
+        self._blocked = command or "an unknown task"
+
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame else ""
+
+        metrics.incr("loop_blocked", command=command or "unknown")
+        logger.warning(
+            "event loop blocked for more than %.3fs while running %s:\n%s",
+            late, self._blocked, stack)
+
+    def start(self) -> None:
+        """Starts watching the running event loop."""
+        if self._task is not None:
+            return
+
+        if envs.TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._heartbeat(),
+                                            name="watchdog")
+        threading.Thread(target=self._monitor, name="watchdog",
+                         daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,226 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+import requests
+from space_data_bot import envs, content
+from space_data_bot.api import SpaceDataApi
+from space_data_bot.metrics import metrics
+from space_data_bot.records import SCHEMAS
+
+
+logger = logging.getLogger(__name__)
+
+# endpoints announced in the channel, with the name of their records
+LABELS = {envs.ORGNAMEPUBLIC: "organisations", envs.WEAPONSPUBLIC: "weapons",
+          envs.SATELLITE: "satellites"}
+WATCHED = (envs.ORGNAMEPUBLIC, envs.WEAPONSPUBLIC)
+# endpoints announced if the watcher has a token
+CONNECTED_WATCHED = (envs.SATELLITE,)
+
+
+def record_hash(record: dict) -> bytes:
+    """Fingerprint of the content of a record."""
+    text = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+
+class Hashes:
+    """Hashes of the last records seen, the oldest being forgotten beyond
+    `size`."""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._hashes = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def update(self, id, digest: bytes) -> str:
+        """Returns: str: "new", "changed" or None if the record is known"""
+        old = self._hashes.pop(id, None)
+        self._hashes[id] = digest
+        if len(self._hashes) > self._size:
+            self._hashes.popitem(last=False)
+
+        if old is None:
+            return "new"
+        return "changed" if old != digest else None
+
+
+class ChangeWatcher:
+    """Announces the new and changed records of recon.space.
+
+    The `records` counts are polled, and pages are only downloaded when they
+    move: starting from the last page, until as many new records as the count
+    grew by are found. The cost of a poll is thus proportional to the size of
+    the change, and records are compared by hash rather than content.
+    """
+
+    def __init__(self, api: SpaceDataApi, send,
+                 interval: float = envs.WATCH_INTERVAL,
+                 max_hashes: int = envs.WATCH_MAX_HASHES,
+                 token_id: str = None) -> None:
+        """
+        Args:
+            api (SpaceDataApi): the API client.
+            send (coroutine function): posts a message in the channel.
+            interval (float, optional): seconds between two polls.
+            max_hashes (int, optional): record hashes kept per endpoint.
+            token_id (str, optional): user whose token gives access to
+                CONNECTED_WATCHED.
+        """
+        self._api = api
+        self._send = send
+        self._interval = interval
+        self._token_id = token_id
+        self._records = None
+        self._counts = {}
+        self._hashes = {path: Hashes(max_hashes)
+                        for path in WATCHED + CONNECTED_WATCHED}
+        self._task = None
+
+    def _paths(self) -> tuple:
+        token = self._api.get_token(self._token_id) if self._token_id \
+            else None
+        return WATCHED + (CONNECTED_WATCHED if token else ()), token
+
+    def _page(self, path: str, number: int, token: str) -> tuple:
+        """Downloads a page, refreshing the token once if it expired.
+
+        Returns:
+            tuple: (page, token to use for the next pages)
+        """
+        return self._api.with_token(
+            self._token_id, token,
+            lambda token: self._api.page(path, number, token))
+
+    def _diff(self, path: str, data: list[dict]) -> tuple:
+        """Returns: tuple: (new records, changed records)"""
+        key = SCHEMAS[path][0][0]
+        hashes = self._hashes[path]
+        new, changed = [], []
+
+        for record in data:
+            state = hashes.update(record.get(key), record_hash(record))
+            if state == "new":
+                new.append(record)
+            elif state == "changed":
+                changed.append(record)
+
+        return new, changed
+
+    def _changes(self, path: str, token: str, baseline: bool) -> tuple:
+        """Downloads the pages of an endpoint needed to find its changes.
+        Blocking, to be run in a thread.
+
+        Returns:
+            tuple: (new records, changed records)
+        """
+        first, token = self._page(path, 1, token)
+        if not isinstance(first, dict):  # not paginated, diffed whole
+            new, changed = self._diff(path, first)
+            return ([], []) if baseline else (new, changed)
+
+        count = first.get("count", 0)
+        grown = count - self._counts.get(path, count)
+        results = first.get("results", [])
+        if not results:
+            self._counts[path] = count
+            return [], []
+
+        size = len(results)
+        number = -(-count // size) if first.get("next") else 1
+        new, changed = [], []
+
+        # new records come last, the last page also shows recent edits
+        while number >= 1:
+            if number == 1:
+                page = first
+            else:
+                page, token = self._page(path, number, token)
+            page_new, page_changed = self._diff(path,
+                                                page.get("results", []))
+            new = page_new + new
+            changed = page_changed + changed
+            metrics.incr("watcher_pages", endpoint=path)
+
+            if baseline or len(new) >= grown or not page_new:
+                break
+            number -= 1
+
+        self._counts[path] = count  # only once the changes are found
+        return ([], []) if baseline else (new, changed)
+
+    async def poll(self) -> None:
+        """Announces the changes since the last poll, the first poll only
+        recording the current state."""
+        records = await asyncio.to_thread(self._api.page, envs.RECORDS, 1)
+        if records == self._records:
+            return
+
+        baseline = self._records is None
+        paths, token = await asyncio.to_thread(self._paths)
+        failed = False
+
+        for path in paths:  # an endpoint failing does not stop the others
+            try:
+                new, changed = await asyncio.to_thread(self._changes, path,
+                                                       token, baseline)
+            except requests.RequestException:
+                logger.exception("change watcher failed on %s", path)
+                metrics.incr("watcher_errors", endpoint=path)
+                failed = True
+                continue
+
+            metrics.incr("watcher_changes", len(new) + len(changed),
+                         endpoint=path)
+            if new or changed:
+                await self._send(content.changes_message(
+                    LABELS[path], new, changed))
+
+        if not failed:  # else the same counts are polled again
+            self._records = records
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("change watcher failed")
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="watcher")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,85 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+
+from space_data_bot import envs
+from space_data_bot.metrics import metrics
+
+
+_executor = None
+
+
+def executor() -> Executor:
+    """The pool shared by the bot, created on first use according to
+    envs.WORKERS_EXECUTOR."""
+    global _executor
+
+    if _executor is None:
+        if envs.WORKERS_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(envs.WORKERS_NUMBER)
+        elif envs.WORKERS_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(envs.WORKERS_NUMBER,
+                                           thread_name_prefix="worker")
+        else:
+            raise ValueError(
+                f"unknown workers executor: {envs.WORKERS_EXECUTOR}")
+
+    return _executor
+
+
+async def run(func, *args, size: int = None, **kwargs):
+    """Runs func(*args, **kwargs) in the pool without blocking the event
+    loop. With a process pool, func and its arguments must be picklable.
+
+    Args:
+        func (Callable): a module-level function, eg: content.data_message
+        size (int, optional): size of the payload in bytes; payloads smaller
+            than envs.WORKERS_INLINE_SIZE are processed inline, the hand-off
+            would cost more than the work.
+
+    Returns:
+        the result of func
+    """
+    name = getattr(func, "__name__", "task")
+
+    if size is not None and size < envs.WORKERS_INLINE_SIZE:
+        metrics.incr("workers_inline", task=name)
+        return func(*args, **kwargs)
+
+    metrics.incr("workers_offloaded", task=name)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown() -> None:
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
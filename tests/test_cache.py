@@ -0,0 +1,146 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import threading
+import time
+
+import pytest
+
+from space_data_bot import envs
+from space_data_bot.api import SpaceDataApi
+from space_data_bot.cache import RedisBackend, StandInServer
+from space_data_bot.mockapi import MockApiServer
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        yield server
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    with MockApiServer(records=5) as mock_api:
+        monkeypatch.setattr(envs, "API_ROOT", mock_api.root)
+        yield mock_api
+
+
+def backend(server: StandInServer) -> RedisBackend:
+    return RedisBackend(*server.server_address)
+
+
+def test_set_and_get(server):
+    first, second = backend(server), backend(server)
+
+    first.set("key", b"value")
+    assert second.get("key") == b"value"
+    assert second.get("missing") is None
+
+    second.delete("key")
+    assert first.get("key") is None
+
+
+def test_set_expires(server):
+    cache = backend(server)
+
+    cache.set("key", b"value", ttl=0.1)
+    assert cache.get("key") == b"value"
+    time.sleep(0.15)
+    assert cache.get("key") is None
+
+
+def test_add_only_once(server):
+    first, second = backend(server), backend(server)
+
+    assert first.add("lock", b"first", ttl=0.1)
+    assert not second.add("lock", b"second", ttl=0.1)
+    assert second.get("lock") == b"first"
+
+    time.sleep(0.15)  # expired
+    assert second.add("lock", b"second")
+    assert first.get("lock") == b"second"
+
+
+def test_reconnects_after_disconnection(server):
+    cache = backend(server)
+    cache.set("key", b"value")
+
+    server.disconnect()
+    assert cache.get("key") == b"value"
+
+
+def test_unreachable_server_is_a_miss():
+    with StandInServer() as server:
+        address = server.server_address
+    cache = RedisBackend(*address, timeout=0.1)
+
+    assert cache.get("key") is None
+    cache.set("key", b"value")  # dropped
+    assert cache.add("lock", b"owner")  # nobody to coordinate with
+
+
+def test_processes_share_tokens(server):
+    first, second = SpaceDataApi(backend(server)), SpaceDataApi(
+        backend(server))
+
+    first.set_token("42", {"access": "access", "refresh": "refresh"})
+    assert second.get_token("42") == "access"
+    assert second.get_token("42", "refresh") == "refresh"
+
+
+def test_processes_share_responses(server, mock_api):
+    first, second = SpaceDataApi(backend(server)), SpaceDataApi(
+        backend(server))
+
+    data, _, _ = first.load(envs.WEAPONSPUBLIC)
+    assert mock_api.requests == 1
+
+    assert second.peek(envs.WEAPONSPUBLIC)[0] == data
+    assert second.load(envs.WEAPONSPUBLIC)[0] == data
+    assert mock_api.requests == 1
+
+
+def test_coalesce_stops_waiting_for_a_failed_load(server):
+    owner, waiter = SpaceDataApi(backend(server)), SpaceDataApi(
+        backend(server))
+    loading = threading.Event()
+
+    def fail():
+        loading.set()
+        time.sleep(0.2)
+        raise OSError("recon.space unavailable")
+
+    def load_and_fail():
+        with pytest.raises(OSError):
+            owner._coalesce("key", 3, fail)
+
+    thread = threading.Thread(target=load_and_fail)
+    thread.start()
+    loading.wait()
+
+    start = time.monotonic()
+    assert waiter._coalesce("key", 3, lambda: (200, b"[]", None)) \
+        == (200, b"[]", None)
+    assert time.monotonic() - start < 1
+    thread.join()
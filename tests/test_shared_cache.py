@@ -0,0 +1,128 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import base64
+import json
+import time
+
+import pytest
+
+from space_data_bot import content, envs
+from space_data_bot.api import SpaceDataApi
+from space_data_bot.cache import MemoryBackend
+from space_data_bot.mockapi import MockApiServer
+
+QUERY = {"orgname": "Organisation"}
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    with MockApiServer(records=5) as mock_api:
+        monkeypatch.setattr(envs, "API_ROOT", mock_api.root)
+        yield mock_api
+
+
+@pytest.fixture
+def api(mock_api):
+    """An API client whose shared orgname response was cached for a
+    connected user."""
+    api = SpaceDataApi(MemoryBackend())
+    assert login(api, "first") is not None
+    data, _, _ = api.load(envs.ORGNAME, api.get_token("first"), **QUERY)
+    assert data["results"]
+    return api
+
+
+def login(api: SpaceDataApi, user: str) -> str:
+    assert api.connect(f"{user}@example.org", "password", id=user) \
+        == content.LOG_SUCCESS
+    return api.get_token(user)
+
+
+def jwt(exp: float) -> str:
+    """An unsigned JWT expiring at exp, as only its claims are read."""
+    def encode(data: dict) -> str:
+        raw = base64.urlsafe_b64encode(json.dumps(data).encode())
+        return raw.decode().rstrip("=")
+
+    return f"{encode({'alg': 'none'})}.{encode({'exp': exp})}.signature"
+
+
+def test_accepted_token_reads_shared_response(api, mock_api):
+    token = login(api, "second")
+    requests = mock_api.requests
+
+    assert token != api.get_token("first")
+    assert api.peek(envs.ORGNAME, token, **QUERY) is not None
+    data, size, _ = api.load(envs.ORGNAME, token, **QUERY)
+    assert data["results"] and size
+    assert mock_api.requests == requests
+
+
+def test_forged_token_is_checked_upstream(api, mock_api):
+    requests = mock_api.requests
+
+    assert api.peek(envs.ORGNAME, "forged", **QUERY) is None
+    assert api.load(envs.ORGNAME, "forged", **QUERY) == \
+        (content.LOG_ERROR, 0, None)
+    assert mock_api.requests == requests + 1
+    assert api.peek(envs.ORGNAME, "forged", **QUERY) is None
+
+
+def test_missing_token_is_checked_upstream(api, mock_api):
+    assert api.peek(envs.ORGNAME, None, **QUERY) is None
+    assert api.load(envs.ORGNAME, None, **QUERY)[0] == content.LOG_ERROR
+
+
+def test_expired_token_never_reads_shared_response(api, mock_api):
+    expired = jwt(time.time() - 1)
+    mock_api.tokens.add(expired)  # still accepted by recon.space
+
+    assert api.peek(envs.ORGNAME, expired, **QUERY) is None
+    data, _, _ = api.load(envs.ORGNAME, expired, **QUERY)
+    assert data["results"]  # downloaded for it
+    assert api.peek(envs.ORGNAME, expired, **QUERY) is None
+
+
+def test_valid_jwt_is_trusted_once_accepted(api, mock_api):
+    token = jwt(time.time() + 3600)
+    mock_api.tokens.add(token)
+
+    assert api.peek(envs.ORGNAME, token, **QUERY) is None
+    api.load(envs.ORGNAME, token, **QUERY)
+    requests = mock_api.requests
+    assert api.peek(envs.ORGNAME, token, **QUERY) is not None
+    assert mock_api.requests == requests
+
+
+def test_refused_token_is_refreshed(api, mock_api):
+    token = api.get_token("first")
+    mock_api.tokens.discard(token)  # expired upstream
+
+    (data, _, _), refreshed = api.with_token(
+        "first", token,
+        lambda token: api.load(envs.ORGNAME, token, orgname="Other"),
+        rejected=lambda loaded: loaded[0] == content.LOG_ERROR)
+    assert refreshed != token
+    assert data["results"]
@@ -0,0 +1,156 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import pytest
+
+from space_data_bot import envs, records, snapshot
+from space_data_bot.dataset import Dataset
+from space_data_bot.records import TagTable
+from space_data_bot.tagindex import positions
+
+ORGANISATIONS = [
+    {"id": 1, "organisationname": "NASA", "orgtype": "Government",
+     "description": "Agency", "tags": ["Agency"]},
+    {"id": 2, "organisationname": "ESA", "orgtype": "Government",
+     "description": "Agency", "tags": ["Agency", "Misc"], "website": "esa"},
+    {"id": 3, "organisationname": "SpaceX", "orgtype": "For Profit",
+     "description": "Launcher", "tags": ["Launcher", "Manufacturer"]},
+]
+SATELLITES = [
+    {"id": 7, "satellitename": "SAT-7", "satellitecountryoperator": "France",
+     "satelliteorbit": "GEO", "satellitelaunchvehicle": "Ariane 5"},
+]
+
+
+def use_tags(monkeypatch, *names) -> TagTable:
+    """A tag table of a new process, numbering the names first."""
+    table = TagTable()
+    for name in names:
+        table.id(name)
+    monkeypatch.setattr(records, "tags", table)
+    monkeypatch.setattr(snapshot, "tags", table)
+    return table
+
+
+@pytest.fixture
+def saved(tmp_path, monkeypatch):
+    """The file of a snapshot saved by another process."""
+    use_tags(monkeypatch)
+    dataset = Dataset((envs.ORGNAMEPUBLIC, envs.SATELLITE))
+    dataset.add(envs.ORGNAMEPUBLIC, ORGANISATIONS)
+    dataset.add(envs.SATELLITE, SATELLITES)
+    dataset.complete.add(envs.ORGNAMEPUBLIC)
+    dataset.synced = 1000.0
+
+    file = str(tmp_path / "spacedata.snapshot")
+    snapshot.save(dataset, file)
+    return file
+
+
+def dicts(dataset: Dataset, path: str) -> list[dict]:
+    store = dataset.stores[path]
+    return store.to_dicts(range(len(store)))
+
+
+def test_round_trip(saved):
+    dataset, created = snapshot.load(saved, Dataset)
+
+    assert created > 0
+    assert dataset.stores[envs.ORGNAMEPUBLIC].frozen
+    assert dicts(dataset, envs.ORGNAMEPUBLIC) == ORGANISATIONS
+    assert dicts(dataset, envs.SATELLITE) == SATELLITES
+    assert dataset.complete == {envs.ORGNAMEPUBLIC}
+    assert dataset.synced == 1000.0
+    assert dataset.stores[envs.ORGNAMEPUBLIC].seen == {
+        "id", "organisationname", "orgtype", "description", "tags"}
+    assert dataset.stats[envs.ORGNAMEPUBLIC].count("orgtype",
+                                                   "government") == 2
+    assert dataset.stats[envs.SATELLITE].top(envs.F_SATORBIT) == [("GEO", 1)]
+
+
+def test_tag_ids_remapped(saved, monkeypatch):
+    table = use_tags(monkeypatch, "Manufacturer", "Other", "Misc")
+    dataset, _ = snapshot.load(saved, Dataset)
+
+    assert table.names[:3] == ["Manufacturer", "Other", "Misc"]
+    assert dicts(dataset, envs.ORGNAMEPUBLIC) == ORGANISATIONS
+    assert positions(dataset.select_tags(
+        envs.ORGNAMEPUBLIC, "Agency AND NOT Misc")) == [0]
+    assert positions(dataset.select_tags(
+        envs.ORGNAMEPUBLIC, "Manufacturer OR Misc")) == [1, 2]
+
+
+def test_modified_after_load(saved):
+    dataset, _ = snapshot.load(saved, Dataset)
+    nasa = {**ORGANISATIONS[0], "tags": ["Agency", "Misc"]}
+    blue = {"id": 4, "organisationname": "Blue Origin",
+            "orgtype": "For Profit", "description": "Launcher",
+            "tags": ["Launcher"]}
+
+    dataset.add(envs.ORGNAMEPUBLIC, [nasa, blue])
+
+    store = dataset.stores[envs.ORGNAMEPUBLIC]
+    assert not store.frozen
+    assert dicts(dataset, envs.ORGNAMEPUBLIC) == \
+        [nasa] + ORGANISATIONS[1:] + [blue]
+    assert positions(dataset.select_tags(envs.ORGNAMEPUBLIC, "Misc")) \
+        == [0, 1]
+    assert positions(dataset.select_tags(envs.ORGNAMEPUBLIC, "Launcher")) \
+        == [2, 3]
+    assert dataset.stats[envs.ORGNAMEPUBLIC].count("orgtype",
+                                                   "For Profit") == 2
+
+    reloaded, _ = snapshot.load(saved, Dataset)  # the file is unchanged
+    assert dicts(reloaded, envs.ORGNAMEPUBLIC) == ORGANISATIONS
+
+
+def test_new_version_after_load(saved):
+    dataset, _ = snapshot.load(saved, Dataset)
+    spacex = {**ORGANISATIONS[2], "orgtype": "Government"}
+
+    version = dataset.updated([(envs.ORGNAMEPUBLIC, [spacex])])
+
+    assert dicts(version, envs.ORGNAMEPUBLIC)[2] == spacex
+    assert dicts(dataset, envs.ORGNAMEPUBLIC) == ORGANISATIONS
+    assert dataset.stores[envs.ORGNAMEPUBLIC].frozen
+    assert version.stores[envs.SATELLITE] is dataset.stores[envs.SATELLITE]
+
+
+def test_other_platform(saved, monkeypatch):
+    monkeypatch.setattr(snapshot, "_platform", lambda: {
+        "byteorder": "other", "itemsizes": {"H": 2, "I": 4, "q": 8}})
+
+    assert snapshot.load(saved, Dataset) is None
+
+
+def test_missing_or_invalid_file(tmp_path):
+    assert snapshot.load(str(tmp_path / "missing"), Dataset) is None
+
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    assert snapshot.load(str(empty), Dataset) is None
+
+    other = tmp_path / "other"
+    other.write_bytes(b"not a snapshot file")
+    assert snapshot.load(str(other), Dataset) is None
@@ -0,0 +1,111 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+
+import pytest
+
+from space_data_bot.api import _stream_records
+
+RECORDS = [{"id": i, "name": f"Organisation {i}", "tags": ["Agency"]}
+           for i in range(10)]
+
+
+def stream(body, size: int, limit: int = 3, max_bytes: int = 1000,
+           head: int = 0):
+    """Streams a body in chunks of size bytes, after head bytes already
+    read."""
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    chunks = iter([body[i:i + size] for i in range(head, len(body), size)])
+    return _stream_records(body[:head], chunks, limit, max_bytes)
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10_000])
+def test_list_in_chunks(size):
+    assert stream(RECORDS, size) == (RECORDS[:3], 10)
+
+
+@pytest.mark.parametrize("head", [0, 1, 30])
+def test_list_after_head(head):
+    assert stream(RECORDS, 5, head=head) == (RECORDS[:3], 10)
+
+
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_numbers_split_between_chunks(size):
+    body = b"[12345, 678.5e1, -9, true, null]"
+    assert stream(body, size, limit=10) == \
+        ([12345, 6785.0, -9, True, None], 5)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5])
+def test_multibyte_characters_split_between_chunks(size):
+    records = [{"name": "Agence spatiale européenne ✈ 宇宙"}] * 4
+    assert stream(records, size) == (records[:3], 4)
+
+
+@pytest.mark.parametrize("size", [1, 16, 10_000])
+def test_page_keys_before_results(size):
+    page = {"count": 10, "next": "https://api/?page=2", "previous": None,
+            "results": RECORDS}
+    assert stream(page, size) == ({**page, "results": RECORDS[:3]}, 10)
+
+
+@pytest.mark.parametrize("size", [1, 16, 10_000])
+def test_page_keys_after_results(size):
+    page = {"results": RECORDS, "count": 10, "next": None,
+            "previous": "https://api/?page=1"}
+    assert stream(page, size) == ({**page, "results": RECORDS[:3]}, 10)
+
+
+@pytest.mark.parametrize("body", [b"[]", b"  [ ]  "])
+def test_empty_list(body):
+    assert stream(body, 1) == ([], 0)
+
+
+def test_empty_page():
+    page = {"count": 0, "next": None, "results": []}
+    assert stream(page, 1) == (page, 0)
+
+
+def test_no_more_than_limit_records():
+    assert stream(RECORDS, 8, limit=20) == (RECORDS, 10)
+    assert stream(RECORDS, 8, limit=0) == ([], 10)
+
+
+def test_record_larger_than_max_bytes():
+    records = RECORDS[:1] + [{"description": "x" * 5000}] + RECORDS
+    with pytest.raises(ValueError, match="larger than the byte ceiling"):
+        stream(records, 100, max_bytes=1000)
+
+
+def test_truncated_body():
+    body = json.dumps(RECORDS).encode()[:-10]
+    with pytest.raises(ValueError):
+        stream(body, 16)
+
+
+def test_not_a_list():
+    with pytest.raises(ValueError, match="no records"):
+        stream({"detail": "not found"}, 4)
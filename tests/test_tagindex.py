@@ -0,0 +1,96 @@
+"""
+MIT License
+
+Copyright (c) 2024 Alliance Stratégique des Étudiants du Spatial (ASTRES)
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import pytest
+
+from space_data_bot import records
+from space_data_bot.tagindex import TagIndex, parse, positions
+
+TAGS = [
+    ["Agency"],
+    ["Agency", "Misc"],
+    ["Manufacturer"],
+    ["Misc", "Not Applicable"],
+    [],
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    store = records.RecordStore(records.ORGANISATION)
+    store.extend([{"id": i, "organisationname": f"Organisation {i}",
+                   "tags": tags} for i, tags in enumerate(TAGS)])
+    return TagIndex.build(store)
+
+
+def select(index: TagIndex, expression: str) -> list[int]:
+    return positions(parse(expression)(index))
+
+
+def test_single_tag_is_case_insensitive(index):
+    assert select(index, "agency") == [0, 1]
+    assert select(index, "AGENCY") == [0, 1]
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("Agency OR Misc AND Manufacturer", [0, 1]),
+    ("Agency, Manufacturer", [0, 1, 2]),
+    ("Agency | Manufacturer & Misc", [0, 1]),
+    ("(Agency OR Manufacturer) AND NOT Misc", [0, 2]),
+    ("NOT Agency AND NOT Misc", [2, 4]),
+    ("NOT NOT Agency", [0, 1]),
+    ("!Agency & !Misc", [2, 4]),
+    ("Agency AND (Misc OR (Manufacturer))", [1]),
+])
+def test_operator_priority(index, expression, expected):
+    assert select(index, expression) == expected
+
+
+def test_quoted_tag_holding_a_keyword(index):
+    assert select(index, '"Not Applicable"') == [3]
+    assert select(index, 'NOT "not applicable" AND Misc') == [1]
+
+
+def test_unquoted_keyword_is_an_operator(index):
+    with pytest.raises(ValueError, match="Applicable"):
+        select(index, "Not Applicable")
+
+
+def test_unknown_tags_are_named(index):
+    with pytest.raises(ValueError, match="unknown tags: 'Agncy', 'Typo'"):
+        select(index, "Agncy OR NOT Typo AND Misc")
+
+
+def test_unknown_tag_under_not(index):
+    with pytest.raises(ValueError, match="unknown tag: 'Typo'"):
+        select(index, "NOT Typo")
+
+
+@pytest.mark.parametrize("expression", [
+    "", "   ", "Agency AND", "(Agency OR Misc", "Agency)", "AND Agency",
+    "Agency Misc)", "NOT", "()",
+])
+def test_malformed_expression(expression):
+    with pytest.raises(ValueError):
+        parse(expression)